@@ -0,0 +1,17 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+
+from app.services.warmup import warmup_state
+
+router = APIRouter()
+
+
+@router.get("/ready")
+async def ready() -> ORJSONResponse:
+    """
+    Готовность воркера принимать трафик: 503, пока идёт прогрев кеша
+    """
+    status = HTTPStatus.OK if warmup_state.ready.is_set() else HTTPStatus.SERVICE_UNAVAILABLE
+    return ORJSONResponse(warmup_state.snapshot(), status_code=status)
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+
+from app.core.metrics import metrics
+from app.services.cache import local_cache
+
+router = APIRouter()
+
+
+@router.get("/")
+async def get_metrics() -> dict:
+    """
+    Счётчики текущего воркера: попадания и промахи по уровням кеша
+    """
+    counters = metrics.snapshot()
+    if local_cache is not None:
+        counters["cache.l1.size"] = len(local_cache)
+    return counters
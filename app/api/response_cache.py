@@ -0,0 +1,155 @@
+from hashlib import md5
+from typing import Callable, Coroutine
+from uuid import UUID
+
+import orjson
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from starlette.status import HTTP_200_OK, HTTP_304_NOT_MODIFIED
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import redis
+from app.services.cache import (
+    entity_tag, generations, list_tag, local_cache, person_films_tag, tag_in_pipeline,
+)
+from app.services.film import normalize_films_params
+from app.utils.query_params import normalize_query
+
+# ETag - это md5 тела в кавычках, в кеше он хранится перед телом ответа
+ETAG_LENGTH = 34
+
+# Раздел API -> индекс, из которого он отдаёт данные
+RESOURCE_INDICES = {"films": "movies", "genres": "genres", "persons": "persons"}
+
+
+class CachedResponseRoute(APIRoute):
+    """
+    Маршрут, который кеширует итоговое тело успешных GET-ответов
+    по пути и нормализованным параметрам запроса, отдаёт сильный ETag
+    и отвечает 304 на совпадающий If-None-Match.
+    При попадании в кеш обработчик, сервисы и Elasticsearch не вызываются.
+    Ключ содержит поколения индексов ответа, а сам ответ помечается
+    тегами, как ключи сервисов, и сбрасывается вместе с ними.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[None, None, Response]]:
+        route_handler = super().get_route_handler()
+        if not settings.response_cache_enabled or "GET" not in self.methods:
+            return route_handler
+        index = next(
+            (RESOURCE_INDICES[part] for part in self.path.split("/") if part in RESOURCE_INDICES),
+            None,
+        )
+        if index is None:
+            return route_handler
+        # Фильмы персоны собраны из индекса фильмов
+        person_films = self.path.endswith("/film")
+        indices = (index, "movies") if person_films else (index,)
+
+        async def cached_route_handler(request: Request) -> Response:
+            # Страницы по курсору одноразовые, а курсор следующей страницы
+            # передаётся в заголовке, который в кеше не хранится
+            if "cursor" in request.query_params:
+                return await route_handler(request)
+
+            if settings.cache_generations_enabled:
+                for name in indices:
+                    await generations.refresh(redis.redis, name)
+            key = response_cache_key(request, indices)
+            cached = await get_cached_response(key)
+            if cached is not None:
+                metrics.incr("cache.response.hits")
+                etag, body = cached
+            else:
+                metrics.incr("cache.response.misses")
+                response = await route_handler(request)
+                if response.status_code != HTTP_200_OK:
+                    return response
+                body = response.body
+                etag = f'"{md5(body).hexdigest()}"'
+                await put_response_to_cache(
+                    key, etag, body, response_tags(request, index, person_films),
+                )
+
+            if etag_matches(request.headers.get("if-none-match"), etag):
+                return Response(status_code=HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            return Response(body, media_type="application/json", headers={"ETag": etag})
+
+        return cached_route_handler
+
+
+def response_cache_key(request: Request, indices: tuple[str, ...] = ()) -> str:
+    # Нулевое поколение не пишется в ключ, как в ключах сервисов
+    namespace = "".join(
+        f":{index}:g{generations.get(index)}" for index in indices if generations.get(index)
+    )
+    params = orjson.dumps(normalize_params(request), option=orjson.OPT_SORT_KEYS)
+    return f"response{namespace}:{request.url.path}:{md5(params).hexdigest()}"
+
+
+def normalize_params(request: Request) -> dict[str, str]:
+    """
+    Параметры запроса, приведённые к виду, в котором их получают сервисы:
+    разные написания одного запроса попадают в один ключ. Обработчик видит
+    последнее значение повторённого параметра, поэтому ключ строится по нему
+    """
+    params = dict(request.query_params)
+    if "query" in params:
+        params["query"] = normalize_query(params["query"])
+    if "genre" in params or "sort" in params:
+        genre, sort = normalize_films_params(params.get("genre"), params.get("sort"))
+        # Пустое значение отличается от отсутствующего: у sort есть значение по умолчанию
+        for name, value in (("genre", genre), ("sort", sort)):
+            if name in params:
+                params[name] = value or ""
+    return params
+
+
+def response_tags(request: Request, index: str, person_films: bool) -> tuple[str, ...]:
+    """
+    Теги ответа: страницы фильмов персоны, запись по id или списки индекса
+    """
+    if not request.path_params:
+        return (list_tag(index),)
+    # Ответ 200 получен, значит id в пути - корректный UUID
+    _id = UUID(str(next(iter(request.path_params.values()))))
+    if person_films:
+        return (person_films_tag(_id),)
+    return (entity_tag(index, _id),)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+
+async def get_cached_response(key: str) -> tuple[str, bytes] | None:
+    if local_cache is not None:
+        cached = local_cache.get(key)
+        if cached is not None:
+            return cached
+
+    data = await redis.redis.get(key)
+    if not data:
+        return None
+    cached = data[:ETAG_LENGTH].decode(), data[ETAG_LENGTH:]
+    if local_cache is not None:
+        local_cache.set(key, cached, settings.response_cache_timeout)
+    return cached
+
+
+async def put_response_to_cache(key: str, etag: str, body: bytes, tags: tuple[str, ...] = ()) -> None:
+    if settings.cache_tags_enabled and tags:
+        # Ответ и его теги записываются одним конвейером
+        async with redis.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, etag.encode() + body, settings.response_cache_timeout)
+            tag_in_pipeline(pipe, key, tags, settings.response_cache_timeout)
+            await pipe.execute()
+    else:
+        await redis.redis.set(key, etag.encode() + body, settings.response_cache_timeout)
+    if local_cache is not None:
+        local_cache.set(key, (etag, body), settings.response_cache_timeout)
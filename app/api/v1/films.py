@@ -1,12 +1,16 @@
 from http import HTTPStatus
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from app.api.response_cache import CachedResponseRoute
+from fastapi.responses import ORJSONResponse
+from app.models.film import Film, Films
 from app.services.film import FilmService, get_film_service
-from app.utils.dc_objects import PaginatedParams
+from app.utils.cursor import NEXT_CURSOR_HEADER
+from app.utils.dc_objects import BatchParams, PaginatedParams
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from uuid import UUID
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
 
 
 class BaseFilmModelResponse(BaseModel):
@@ -73,52 +77,114 @@ class FilmListResponse(BaseFilmModelResponse):
     pass
 
 
+# Поля FilmResponse и их сборка из фильма; используются и для ?fields=
+FILM_RESPONSE_FIELDS = {
+    "uuid": lambda film: film.id,
+    "title": lambda film: film.title,
+    "imdb_rating": lambda film: film.imdb_rating,
+    "description": lambda film: film.description,
+    "genre": lambda film: [
+        {"uuid": genre.uuid, "name": genre.name} for genre in film.genre
+    ],
+    "directors": lambda film: [
+        {"uuid": director.uuid, "full_name": director.full_name}
+        for director in film.director
+    ],
+    "actors": lambda film: [
+        {"uuid": actor.id, "full_name": actor.name} for actor in film.actors
+    ],
+    "writers": lambda film: [
+        {"uuid": writer.id, "full_name": writer.name} for writer in film.writers
+    ],
+}
+
+
+def film_response_body(film: Film, fields: set[str] | None = None) -> dict:
+    """
+    Тело ответа в формате FilmResponse.
+    Если заданы fields, собираются только эти поля
+    """
+    return {
+        name: build(film)
+        for name, build in FILM_RESPONSE_FIELDS.items()
+        if fields is None or name in fields
+    }
+
+
+def parse_fields(fields: str | None) -> set[str] | None:
+    """
+    Разобрать параметр ?fields=title,imdb_rating
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested - FILM_RESPONSE_FIELDS.keys()
+    if unknown:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                            detail=f'unknown fields: {", ".join(sorted(unknown))}')
+    return requested
+
+
+def film_list_response_body(films: List[Films]) -> list[dict]:
+    """
+    Тело ответа в формате List[FilmListResponse]
+    """
+    return [
+        {"uuid": film.id, "title": film.title, "imdb_rating": film.imdb_rating}
+        for film in films
+    ]
+
+
+def cursor_response(body: list[dict], next_cursor: str | None) -> ORJSONResponse:
+    """
+    Ответ со страницей по курсору: курсор следующей страницы - в заголовке
+    """
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return ORJSONResponse(body, headers=headers)
+
+
+@router.post('/batch', response_model=List[Optional[FilmResponse]])
+async def films_batch(
+        params: BatchParams,
+        film_service: FilmService = Depends(get_film_service)
+) -> ORJSONResponse:
+    """
+    Получить информацию о нескольких фильмах одним запросом.
+    Порядок совпадает с порядком ids, для ненайденных фильмов - null
+
+    - **ids**: идентификаторы фильмов
+    """
+    films = await film_service.get_many(params.ids)
+    return ORJSONResponse([
+        film_response_body(film) if film else None for film in films
+    ])
+
+
 # Внедряем FilmService с помощью Depends(get_film_service)
 @router.get('/{film_id}', response_model=FilmResponse)
 async def film_details(
         film_id: UUID = Path(..., description='film id'),
+        fields: str | None = Query(
+            None,
+            description='Comma-separated response fields, e.g. title,imdb_rating'
+        ),
         film_service: FilmService = Depends(get_film_service)
-) -> FilmResponse:
+) -> ORJSONResponse:
     """
     Получить информацию о фильме
 
     - **film_id**: идентификатор фильма
+    - **fields**: вернуть только перечисленные поля ответа
     """
+    requested_fields = parse_fields(fields)
     film = await film_service.get_by_id(film_id)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND,
                             detail='film not found')
 
-    # Преобразование данных об актёрах, сценаристах, режиссерах
-    actors_response = [
-        ActorResponse(uuid=actor.id, full_name=actor.name) for actor in film.actors
-    ]
-    writers_response = [
-        WriterResponse(uuid=writer.id, full_name=writer.name) for writer in film.writers
-    ]
-    directors_response = [
-        DirectorResponse(
-            uuid=director.uuid,
-            full_name=director.full_name
-        ) for director in film.director
-    ]
-    genre_response = [
-        GenreResponse(name=genre.name, uuid=genre.uuid) for genre in film.genre
-    ]
-
-    # Создание и возврат объекта ответа, используя преобразованные данные
-    return FilmResponse(
-        uuid=film.id,
-        title=film.title,
-        description=film.description,
-        imdb_rating=film.imdb_rating,
-        genre=genre_response,
-        directors=directors_response,
-        actors_names=film.actors_names,
-        writers_names=film.writers_names,
-        actors=actors_response,
-        writers=writers_response
-    )
+    # Тело ответа собирается сразу в виде словаря: данные фильма уже проверены
+    # при записи в кеш, поэтому повторная валидация по FilmResponse не нужна
+    return ORJSONResponse(film_response_body(film, requested_fields))
 
 
 @router.get(
@@ -130,7 +196,8 @@ async def list_films(
         genre: str | None = Query(None, description='Filter by genre'),
         page_size: int = PaginatedParams.page_size,
         page_number: int = PaginatedParams.page_number,
-        film_service: FilmService = Depends(get_film_service)) -> List[FilmListResponse]:
+        cursor: str | None = PaginatedParams.cursor,
+        film_service: FilmService = Depends(get_film_service)) -> ORJSONResponse:
     """
     Получить список фильмов"
 
@@ -138,13 +205,16 @@ async def list_films(
     - **genre**: фильтрация по жанру
     - **page_size**: размер страницы
     - **page_number**: номер страницы
+    - **cursor**: курсор страницы, следующий возвращается в заголовке X-Next-Cursor
     """
+    if cursor is not None:
+        films, next_cursor = await film_service.get_films_by_cursor(
+            sort=sort, genre=genre, page_size=page_size, cursor=cursor)
+        return cursor_response(film_list_response_body(films), next_cursor)
+
     films = await film_service.get_films(
         sort=sort, genre=genre, page_size=page_size, page_number=page_number)
-    return [FilmListResponse(
-        uuid=film.id,
-        title=film.title,
-        imdb_rating=film.imdb_rating) for film in films]
+    return ORJSONResponse(film_list_response_body(films))
 
 
 @router.get('/search/', response_model=List[FilmListResponse])
@@ -152,19 +222,24 @@ async def search_films(
         query: str = Query(..., description='Search query'),
         page_size: int = PaginatedParams.page_size,
         page_number: int = PaginatedParams.page_number,
+        cursor: str | None = PaginatedParams.cursor,
         film_service: FilmService =
-        Depends(get_film_service)) -> List[FilmListResponse]:
+        Depends(get_film_service)) -> ORJSONResponse:
     """
     Поиск фильмов по запросу
 
     - **query**: запрос поиска
     - **page_size**: размер страницы
     - **page_number**: номер страницы
+    - **cursor**: курсор страницы, следующий возвращается в заголовке X-Next-Cursor
 
     """
+    if cursor is not None:
+        films, next_cursor = await film_service.search_films_by_cursor(
+            query=query, page_size=page_size, cursor=cursor)
+        return cursor_response(film_list_response_body(films), next_cursor)
+
     films = await film_service.search_films(
         query=query, page_size=page_size, page_number=page_number)
 
-    return [FilmListResponse(
-        uuid=film.id, title=film.title, imdb_rating=film.imdb_rating
-    ) for film in films]
+    return ORJSONResponse(film_list_response_body(films))
@@ -1,12 +1,27 @@
-from fastapi import APIRouter, Depends, Path, HTTPException
+from fastapi import APIRouter, Depends, Path, HTTPException, Response
 
+from app.api.response_cache import CachedResponseRoute
 from app.models.genre import Genre
 from http import HTTPStatus
 from uuid import UUID
-from app.utils.dc_objects import PaginatedParams
+from app.utils.cursor import NEXT_CURSOR_HEADER
+from app.utils.dc_objects import BatchParams, PaginatedParams
 from app.services.genres import GenreService, get_genre_service
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
+
+
+@router.post("/batch", response_model=list[Genre | None])
+async def genres_batch(
+        params: BatchParams,
+        service: GenreService = Depends(get_genre_service)) -> list[Genre | None]:
+    """
+    Получение нескольких жанров одним запросом.
+    Порядок совпадает с порядком ids, для ненайденных жанров - null
+
+    - **ids**: идентификаторы жанров
+    """
+    return await service.get_many(params.ids)
 
 
 @router.get("/{genre_id}", response_model=Genre)
@@ -22,8 +37,10 @@ async def get_genre_by_id(
 
 @router.get("/", response_model=list[Genre])
 async def genre(
+        response: Response,
         page_size: int = PaginatedParams.page_size,
         page_number: int = PaginatedParams.page_number,
+        cursor: str | None = PaginatedParams.cursor,
         service: GenreService = Depends(get_genre_service)
 ) -> list[Genre]:
     """
@@ -31,5 +48,12 @@ async def genre(
 
     - **page_size**: размер страницы
     - **page_number**: номер страницы
+    - **cursor**: курсор страницы, следующий возвращается в заголовке X-Next-Cursor
     """
+    if cursor is not None:
+        genres, next_cursor = await service.list_genres_by_cursor(page_size, cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return genres
+
     return await service.list_genres(page_size, page_number)
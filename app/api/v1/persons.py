@@ -1,15 +1,31 @@
 from http import HTTPStatus
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Response
 
+from app.api.response_cache import CachedResponseRoute
 from app.models.base_model import BaseMixin
-from app.utils.dc_objects import PaginatedParams
-from app.models.film import Films
+from app.utils.cursor import NEXT_CURSOR_HEADER
+from app.utils.dc_objects import BatchParams, PaginatedParams
+from app.models.film import PersonFilm
 from app.models.persons import BasePersonModel
 from app.services.person import get_person_service, PersonsService
 
-router = APIRouter()
+router = APIRouter(route_class=CachedResponseRoute)
+
+
+@router.post("/batch", response_model=list[BasePersonModel | None])
+async def persons_batch(
+        params: BatchParams,
+        person_service: PersonsService = Depends(get_person_service)
+) -> list[BaseMixin | None]:
+    """
+    Получение нескольких персон одним запросом.
+    Порядок совпадает с порядком ids, для ненайденных персон - null
+
+    - **ids**: id персон
+    """
+    return await person_service.get_many(params.ids)
 
 
 @router.get("/{person_id}", response_model=BasePersonModel)
@@ -31,9 +47,11 @@ async def get_person_by_id(
 
 @router.get("/", response_model=list[BasePersonModel])
 async def person(
+        response: Response,
         query: str = Query(description='Search query', default=''),
         page_size: int = PaginatedParams.page_size,
         page_number: int = PaginatedParams.page_number,
+        cursor: str | None = PaginatedParams.cursor,
         person_service: PersonsService = Depends(get_person_service)
 ) -> list[BasePersonModel]:
     """
@@ -42,23 +60,41 @@ async def person(
     - **query**: поисковый запрос
     - **page_size**: размер страницы
     - **page_number**: номер страницы
+    - **cursor**: курсор страницы, следующий возвращается в заголовке X-Next-Cursor
     """
+    if cursor is not None:
+        persons, next_cursor = await person_service.search_person_by_cursor(
+            query, page_size, cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return persons
+
     return await person_service.search_person(query, page_size, page_number)
 
 
-@router.get("/{person_id}/film", response_model=list[Films])
+@router.get("/{person_id}/film", response_model=list[PersonFilm])
 async def get_person_by_id(
+        response: Response,
         person_id: UUID = Path(..., description="person's ID"),
         page_size: int = PaginatedParams.page_size,
         page_number: int = PaginatedParams.page_number,
+        cursor: str | None = PaginatedParams.cursor,
         person_service: PersonsService = Depends(get_person_service)
-) -> list[Films]:
+) -> list[PersonFilm]:
     """
     Получение фильмов по id персоны.
 
     - **person_id**: id персоны
     - **page_size**: размер страницы
     - **page_number**: номер страницы
+    - **cursor**: курсор страницы, следующий возвращается в заголовке X-Next-Cursor
 
     """
+    if cursor is not None:
+        films, next_cursor = await person_service.get_films_by_cursor(
+            person_id, page_size, cursor)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return films
+
     return await person_service.get_films(person_id, page_size, page_number)
@@ -10,8 +10,92 @@ class Settings(BaseSettings):
     uvicorn_port: int = Field(default=8000, env="UVICORN_PORT")
     redis_host: str = Field(default="0.0.0.0", env="REDIS_HOST")
     redis_port: int = Field(default=6379, env="REDIS_PORT")
+    # Объединять команды к Redis из одного тика цикла событий в один конвейер
+    redis_autopipeline_enabled: bool = Field(default=False, env="REDIS_AUTOPIPELINE_ENABLED")
+    postgres_host: str = Field(default="0.0.0.0", env="POSTGRES_HOST")
+    postgres_port: int = Field(default=5432, env="POSTGRES_PORT")
+    postgres_db: str = Field(default="postgres", env="POSTGRES_DB")
+    postgres_user: str = Field(default="postgres", env="POSTGRES_USER")
+    postgres_password: str = Field(default="postgres", env="POSTGRES_PASSWORD")
     elastic_host: str = Field(default="0.0.0.0", env="ELASTIC_HOST")
     elastic_port: int = Field(default=9200, env="ELASTIC_PORT")
+    # Параметры индексов, создаваемых командой app.db.manage_indices
+    elastic_number_of_shards: int = Field(default=1, env="ELASTIC_NUMBER_OF_SHARDS")
+    elastic_number_of_replicas: int = Field(default=0, env="ELASTIC_NUMBER_OF_REPLICAS")
+    elastic_refresh_interval: str = Field(default="5s", env="ELASTIC_REFRESH_INTERVAL")
+    # Период обновления справочника жанров в памяти процесса, секунды
+    genres_refresh_interval: int = Field(default=60, env="GENRES_REFRESH_INTERVAL")
+    # Сколько секунд не искать повторно жанр, которого нет в индексе
+    genres_unknown_ttl: float = Field(default=5, env="GENRES_UNKNOWN_TTL")
+    # Время жизни записей и страниц в кеше, секунды
+    cache_timeout: int = Field(default=60 * 5, env="CACHE_TIMEOUT")
+    # Помечать записи кеша тегами (id записи, жанр, персона), чтобы загрузчик
+    # данных мог удалять только затронутые изменениями ключи
+    cache_tags_enabled: bool = Field(default=False, env="CACHE_TAGS_ENABLED")
+    # Номер поколения индекса в ключах кеша: после полной переиндексации
+    # его увеличение сбрасывает все ключи индекса. Номер перечитывается
+    # из Redis раз в CACHE_GENERATION_TTL секунд
+    cache_generations_enabled: bool = Field(default=False, env="CACHE_GENERATIONS_ENABLED")
+    cache_generation_ttl: float = Field(default=5, env="CACHE_GENERATION_TTL")
+    # Локальный кеш (L1) воркера перед Redis
+    l1_cache_enabled: bool = Field(default=False, env="L1_CACHE_ENABLED")
+    l1_cache_size: int = Field(default=10_000, env="L1_CACHE_SIZE")
+    l1_cache_ttl: float = Field(default=10, env="L1_CACHE_TTL")
+    # Межпроцессная блокировка заполнения кеша: ключ пересобирает одна реплика
+    cache_fill_lock_enabled: bool = Field(default=False, env="CACHE_FILL_LOCK_ENABLED")
+    cache_fill_lock_timeout: float = Field(default=3, env="CACHE_FILL_LOCK_TIMEOUT")
+    cache_fill_wait_timeout: float = Field(default=1, env="CACHE_FILL_WAIT_TIMEOUT")
+    cache_fill_poll_interval: float = Field(default=0.05, env="CACHE_FILL_POLL_INTERVAL")
+    # Stale-while-revalidate для списков: после мягкого TTL страница ещё
+    # CACHE_STALE_TIMEOUT секунд отдаётся из кеша, а обновляется в фоне
+    cache_stale_while_revalidate: bool = Field(default=False, env="CACHE_STALE_WHILE_REVALIDATE")
+    cache_stale_timeout: int = Field(default=60 * 5, env="CACHE_STALE_TIMEOUT")
+    # Время жизни отметок «не найдено» (несуществующий id, пустая страница),
+    # 0 отключает негативное кеширование
+    cache_negative_timeout: int = Field(default=30, env="CACHE_NEGATIVE_TIMEOUT")
+    # Страницы списков длиннее порога (в байтах) сжимаются в кеше, 0 - не сжимать
+    cache_compress_threshold: int = Field(default=0, env="CACHE_COMPRESS_THRESHOLD")
+    # Кеш готовых тел ответов API v1 с ETag
+    response_cache_enabled: bool = Field(default=False, env="RESPONSE_CACHE_ENABLED")
+    response_cache_timeout: int = Field(default=60, env="RESPONSE_CACHE_TIMEOUT")
+    # Окно поиска: первые SEARCH_WINDOW_SIZE id выдачи загружаются одним запросом
+    # и кешируются, страницы внутри окна собираются из кеша записей
+    search_window_enabled: bool = Field(default=False, env="SEARCH_WINDOW_ENABLED")
+    search_window_size: int = Field(default=200, env="SEARCH_WINDOW_SIZE")
+    # Фоновая загрузка в кеш следующей страницы списков и поиска после
+    # ответа на текущую; не больше PREFETCH_MAX_CONCURRENCY загрузок на воркер
+    prefetch_enabled: bool = Field(default=False, env="PREFETCH_ENABLED")
+    prefetch_max_concurrency: int = Field(default=4, env="PREFETCH_MAX_CONCURRENCY")
+    # Страницы фильмов по убыванию рейтинга из сортированных множеств Redis,
+    # которые ведёт загрузчик данных (app.services.leaderboard)
+    leaderboard_enabled: bool = Field(default=False, env="LEADERBOARD_ENABLED")
+    # Фильмы персон из обратного индекса в Redis, который ведёт загрузчик
+    # данных (app.services.filmography)
+    filmography_enabled: bool = Field(default=False, env="FILMOGRAPHY_ENABLED")
+    # Прогрев кеша при старте воркера: жанры, первые WARMUP_FILM_PAGES страниц
+    # фильмов по рейтингу (всех и каждого жанра) и фильмы WARMUP_FILM_IDS
+    # (JSON-список id). Воркер готов, когда прогрета доля WARMUP_READY_RATIO
+    # загрузок, но не позже чем через WARMUP_TIMEOUT секунд
+    warmup_enabled: bool = Field(default=False, env="WARMUP_ENABLED")
+    warmup_timeout: float = Field(default=30, env="WARMUP_TIMEOUT")
+    warmup_ready_ratio: float = Field(default=0.9, env="WARMUP_READY_RATIO")
+    warmup_concurrency: int = Field(default=4, env="WARMUP_CONCURRENCY")
+    warmup_film_pages: int = Field(default=1, env="WARMUP_FILM_PAGES")
+    warmup_film_ids: list[str] = Field(default=[], env="WARMUP_FILM_IDS")
+    # Микробатчинг загрузок записей по id: одновременные промахи кеша
+    # в течение окна (секунды) уходят в Elasticsearch одним mget
+    elastic_batch_enabled: bool = Field(default=False, env="ELASTIC_BATCH_ENABLED")
+    elastic_batch_window: float = Field(default=0.002, env="ELASTIC_BATCH_WINDOW")
+    elastic_batch_max_size: int = Field(default=100, env="ELASTIC_BATCH_MAX_SIZE")
+    # ETL из Postgres: размер пачки строк, число параллельных bulk-запросов,
+    # пауза между синхронизациями (секунды) и файл контрольных точек
+    etl_batch_size: int = Field(default=1000, env="ETL_BATCH_SIZE")
+    etl_bulk_concurrency: int = Field(default=4, env="ETL_BULK_CONCURRENCY")
+    etl_sync_interval: float = Field(default=10, env="ETL_SYNC_INTERVAL")
+    etl_state_file: str = Field(default="etl_state.json", env="ETL_STATE_FILE")
+    # Курсорная пагинация: закреплять обход за point-in-time Elasticsearch
+    cursor_pit_enabled: bool = Field(default=False, env="CURSOR_PIT_ENABLED")
+    cursor_pit_keep_alive: str = Field(default="1m", env="CURSOR_PIT_KEEP_ALIVE")
 
     class Config:
         env_file = ".env"
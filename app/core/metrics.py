@@ -0,0 +1,20 @@
+from collections import defaultdict
+
+
+class Metrics:
+    """
+    Счётчики процесса для диагностики кешей.
+    Каждый воркер uvicorn ведёт свои значения.
+    """
+
+    def __init__(self):
+        self._counters: defaultdict[str, float] = defaultdict(float)
+
+    def incr(self, name: str, value: float = 1) -> None:
+        self._counters[name] += value
+
+    def snapshot(self) -> dict[str, float]:
+        return dict(self._counters)
+
+
+metrics = Metrics()
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Any
+
+from redis.asyncio import Redis
+
+from app.core.metrics import metrics
+from app.utils.tasks import run_in_background
+
+
+class AutoPipelineRedis:
+    """
+    Обёртка над клиентом Redis, которая объединяет команды чтения и записи
+    ключей, вызванные в одном тике цикла событий, в один конвейер.
+    Вызывающий код работает с ней как с обычным клиентом: остальные
+    методы (pipeline, lock, pubsub, close, ...) передаются клиенту как есть
+    """
+
+    PIPELINED_COMMANDS = frozenset({"get", "set", "mget", "delete", "pttl"})
+
+    def __init__(self, redis: Redis):
+        self._redis = redis
+        self._queue: list[tuple[str, tuple, dict, asyncio.Future]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        if name in self.PIPELINED_COMMANDS:
+            return lambda *args, **kwargs: self._execute(name, *args, **kwargs)
+        return getattr(self._redis, name)
+
+    async def _execute(self, name: str, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # Исключение помечаем полученным, даже если вызывающий уже отменён
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._queue.append((name, args, kwargs, future))
+        if len(self._queue) == 1:
+            # Отправляем очередь, когда все готовые задачи этого тика выполнили свои команды
+            loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        queue, self._queue = self._queue, []
+        metrics.incr("redis.autopipeline.flushes")
+        metrics.incr("redis.autopipeline.commands", len(queue))
+        run_in_background(self._run(queue))
+
+    async def _run(self, queue: list[tuple[str, tuple, dict, asyncio.Future]]) -> None:
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for name, args, kwargs, _ in queue:
+                    getattr(pipe, name)(*args, **kwargs)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as e:
+            for *_, future in queue:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (*_, future), result in zip(queue, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,81 @@
+"""
+Описание индексов Elasticsearch, которыми владеет сервис.
+Модуль содержит только данные, поэтому его импортируют и функциональные тесты.
+Приложение обращается к индексам по алиасам (movies, genres, persons),
+которые указывают на версионированные индексы (movies_20240101120000 и т.п.).
+"""
+
+# Базовые настройки индекса; число шардов и интервал обновления
+# переопределяются настройками при создании индекса командой manage_indices
+INDEX_SETTINGS = {
+    "number_of_shards": 1,
+    "number_of_replicas": 0,
+    "refresh_interval": "1s",
+}
+
+# Персона внутри документа фильма: id - для точных фильтров, имя - для поиска
+_PERSON = {
+    "properties": {
+        "id": {"type": "keyword"},
+        "name": {"type": "text"},
+    }
+}
+
+MOVIES = {
+    "settings": INDEX_SETTINGS,
+    "mappings": {
+        # Неизвестные поля сохраняются в _source, но не индексируются
+        "dynamic": False,
+        "properties": {
+            "id": {"type": "keyword"},
+            "title": {
+                "type": "text",
+                "fields": {"raw": {"type": "keyword"}},
+            },
+            "imdb_rating": {"type": "float"},
+            "description": {"type": "text"},
+            "genre": {"type": "keyword"},
+            "director": _PERSON,
+            "actors_names": {"type": "text"},
+            "writers_names": {"type": "text"},
+            "actors": _PERSON,
+            "writers": _PERSON,
+        },
+    },
+}
+
+GENRES = {
+    "settings": INDEX_SETTINGS,
+    "mappings": {
+        "dynamic": False,
+        "properties": {
+            "id": {"type": "keyword"},
+            "name": {
+                "type": "text",
+                "fields": {"raw": {"type": "keyword"}},
+            },
+            "description": {"type": "text"},
+        },
+    },
+}
+
+PERSONS = {
+    "settings": INDEX_SETTINGS,
+    "mappings": {
+        "dynamic": False,
+        "properties": {
+            "id": {"type": "keyword"},
+            "full_name": {
+                "type": "text",
+                "fields": {"raw": {"type": "keyword"}},
+            },
+        },
+    },
+}
+
+# Алиас -> описание индекса
+INDICES = {
+    "movies": MOVIES,
+    "genres": GENRES,
+    "persons": PERSONS,
+}
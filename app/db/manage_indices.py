@@ -0,0 +1,237 @@
+"""
+Управление индексами Elasticsearch: создание версионированных индексов
+за алиасами и переиндексация без простоя.
+
+Запуск из корня проекта:
+    python -m app.db.manage_indices create
+    python -m app.db.manage_indices reindex movies --delete-old
+    python -m app.db.manage_indices bump movies
+
+Переиндексация копирует данные в новый индекс в фоне (приложение в это
+время читает старый), затем одним атомарным запросом переключает алиас.
+Если вместо алиаса существует обычный индекс с тем же именем (создан
+ETL динамическим маппингом), он заменяется алиасом в том же запросе.
+Записи, сделанные в старый индекс во время копирования, в новый не попадут:
+на время переиндексации ETL нужно остановить или после неё повторить загрузку.
+
+После переключения алиаса увеличивается поколение кеша индекса: все
+закешированные записи и страницы индекса перестают читаться сразу, без
+перебора ключей в Redis. Команда bump делает то же отдельно, например
+после полной перезагрузки данных через ETL.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.db.indices import INDICES
+from app.services.cache import generations
+
+# Период опроса задачи переиндексации, секунды
+REINDEX_POLL_INTERVAL = 1
+
+
+def index_settings() -> dict:
+    return {
+        "number_of_shards": settings.elastic_number_of_shards,
+        "number_of_replicas": settings.elastic_number_of_replicas,
+        "refresh_interval": settings.elastic_refresh_interval,
+    }
+
+
+def versioned_name(alias: str) -> str:
+    return f"{alias}_{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+
+
+async def current_indices(es: AsyncElasticsearch, alias: str) -> tuple[list[str], bool]:
+    """
+    Индексы, на которые сейчас указывает алиас, и признак того,
+    что под этим именем лежит обычный индекс, а не алиас
+    """
+    if await es.indices.exists_alias(name=alias):
+        return list((await es.indices.get_alias(name=alias)).keys()), False
+    if await es.indices.exists(index=alias):
+        return [alias], True
+    return [], False
+
+
+async def create_index(es: AsyncElasticsearch, alias: str, bulk_load: bool = False) -> str:
+    """
+    Создать новый версионированный индекс по описанию алиаса.
+    Для массовой загрузки обновление и реплики отключаются
+    """
+    index = versioned_name(alias)
+    index_body = {**INDICES[alias]["settings"], **index_settings()}
+    if bulk_load:
+        index_body.update({"refresh_interval": "-1", "number_of_replicas": 0})
+    await es.indices.create(
+        index=index,
+        mappings=INDICES[alias]["mappings"],
+        settings=index_body,
+    )
+    return index
+
+
+def mapping_diff(expected: dict, actual: dict, path: str = "") -> list[str]:
+    """
+    Поля описания индекса, тип которых в живом маппинге другой или которых
+    в нём нет. Лишние поля живого маппинга не считаются расхождением
+    """
+    diff = []
+    actual_properties = actual.get("properties", {})
+    for name, field in expected.get("properties", {}).items():
+        field_path = f"{path}{name}"
+        actual_field = actual_properties.get(name)
+        if actual_field is None:
+            diff.append(f"{field_path}: missing")
+            continue
+        # У объектных полей тип в маппинге не указывается
+        expected_type = field.get("type", "object")
+        actual_type = actual_field.get("type", "object")
+        if expected_type != actual_type:
+            diff.append(f"{field_path}: {actual_type} instead of {expected_type}")
+            continue
+        for subfield, subfield_mapping in field.get("fields", {}).items():
+            actual_subfield = actual_field.get("fields", {}).get(subfield, {})
+            if actual_subfield.get("type") != subfield_mapping["type"]:
+                diff.append(f"{field_path}.{subfield}: {actual_subfield.get('type', 'missing')} "
+                            f"instead of {subfield_mapping['type']}")
+        diff.extend(mapping_diff(field, actual_field, f"{field_path}."))
+    return diff
+
+
+async def check_mappings(es: AsyncElasticsearch, alias: str) -> None:
+    """
+    Проверить, что маппинг существующего индекса совпадает с описанием.
+    Сервисы фильтруют точными term-запросами по keyword-полям: на индексе
+    с динамическим маппингом такие фильтры молча возвращают пустые страницы
+    """
+    response = await es.indices.get_mapping(index=alias)
+    for index, index_mapping in response.items():
+        diff = mapping_diff(INDICES[alias]["mappings"], index_mapping["mappings"])
+        if diff:
+            raise RuntimeError(
+                f"Index {index} mapping differs from app.db.indices ({'; '.join(diff)}), "
+                f"run: python -m app.db.manage_indices reindex {alias}"
+            )
+
+
+async def create_indices(es: AsyncElasticsearch, aliases: list[str]) -> None:
+    """
+    Создать индексы с алиасами для тех алиасов, которых ещё нет.
+    У существующих индексов проверяется маппинг
+    """
+    for alias in aliases:
+        indices, _ = await current_indices(es, alias)
+        if indices:
+            logging.info(f"Index {alias} already exists: {', '.join(indices)}")
+            await check_mappings(es, alias)
+            continue
+        index = await create_index(es, alias)
+        await es.indices.put_alias(index=index, name=alias, is_write_index=True)
+        logging.info(f"Created index {index} with alias {alias}")
+
+
+async def wait_for_task(es: AsyncElasticsearch, task_id: str) -> dict:
+    while True:
+        task = await es.tasks.get(task_id=task_id)
+        status = task["task"]["status"]
+        logging.info(f"Reindexed {status['created'] + status['updated']} of {status['total']}")
+        if task["completed"]:
+            response = task.get("response", {})
+            if task.get("error") or response.get("failures"):
+                raise RuntimeError(f"Reindex task {task_id} failed: {task.get('error') or response['failures']}")
+            return response
+        await asyncio.sleep(REINDEX_POLL_INTERVAL)
+
+
+async def reindex(es: AsyncElasticsearch, alias: str, delete_old: bool = False) -> str:
+    """
+    Перенести данные алиаса в новый индекс с текущим маппингом
+    и атомарно переключить на него алиас
+    """
+    old_indices, is_concrete = await current_indices(es, alias)
+    index = await create_index(es, alias, bulk_load=True)
+    logging.info(f"Created index {index}")
+
+    if old_indices:
+        response = await es.reindex(
+            source={"index": alias},
+            dest={"index": index},
+            wait_for_completion=False,
+        )
+        await wait_for_task(es, response["task"])
+
+    # Возвращаем рабочие настройки и делаем данные видимыми до переключения
+    await es.indices.put_settings(
+        index=index,
+        settings={
+            "refresh_interval": settings.elastic_refresh_interval,
+            "number_of_replicas": settings.elastic_number_of_replicas,
+        },
+    )
+    await es.indices.refresh(index=index)
+
+    if is_concrete:
+        # Обычный индекс удаляется и заменяется алиасом в одном запросе
+        actions = [{"remove_index": {"index": alias}}]
+    else:
+        actions = [{"remove": {"index": old, "alias": alias}} for old in old_indices]
+    actions.append({"add": {"index": index, "alias": alias, "is_write_index": True}})
+    await es.indices.update_aliases(actions=actions)
+    logging.info(f"Alias {alias} now points to {index}")
+
+    if delete_old and old_indices and not is_concrete:
+        await es.indices.delete(index=",".join(old_indices))
+        logging.info(f"Deleted {', '.join(old_indices)}")
+    return index
+
+
+async def bump_generation(alias: str) -> None:
+    """
+    Сбросить кеш индекса, увеличив номер его поколения
+    """
+    redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    try:
+        generation = await generations.bump(redis, alias)
+    finally:
+        await redis.close()
+    logging.info(f"Cache generation of {alias} is now {generation}")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    create_parser = commands.add_parser("create", help="create missing indices behind aliases")
+    create_parser.add_argument("aliases", nargs="*", help=f"default: {' '.join(INDICES)}")
+    reindex_parser = commands.add_parser("reindex", help="rebuild an index and swap its alias")
+    reindex_parser.add_argument("alias", choices=list(INDICES))
+    reindex_parser.add_argument("--delete-old", action="store_true")
+    bump_parser = commands.add_parser("bump", help="drop all cached entries of an index")
+    bump_parser.add_argument("alias", choices=list(INDICES))
+    args = parser.parse_args()
+    if args.command == "create" and set(args.aliases) - INDICES.keys():
+        parser.error(f"unknown aliases: {' '.join(set(args.aliases) - INDICES.keys())}")
+
+    if args.command == "bump":
+        await bump_generation(args.alias)
+        return
+
+    es = AsyncElasticsearch(hosts=[f"http://{settings.elastic_host}:{settings.elastic_port}"])
+    try:
+        if args.command == "create":
+            await create_indices(es, args.aliases or list(INDICES))
+        else:
+            await reindex(es, args.alias, args.delete_old)
+    finally:
+        await es.close()
+    if args.command == "reindex":
+        await bump_generation(args.alias)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+"""
+Загрузка данных из Postgres в Elasticsearch.
+
+Запуск из корня проекта:
+    python -m app.etl          # синхронизация в цикле
+    python -m app.etl --once   # одна синхронизация (первая - полная загрузка)
+
+Для каждой таблицы-источника хранится контрольная точка (отметка времени и id
+последней обработанной строки), поэтому после перезапуска загрузка продолжается
+с места остановки, а повторные синхронизации читают только изменения.
+После записи каждой пачки из кеша API удаляются ключи, помеченные тегами
+изменённых документов. Удаления строк в Postgres не отслеживаются.
+С LEADERBOARD_ENABLED и FILMOGRAPHY_ENABLED загрузчик ведёт в Redis рейтинги
+фильмов (app.services.leaderboard) и обратный индекс фильмографий
+(app.services.filmography): собирает их, если их нет, и обновляет
+по изменённым фильмам.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime
+from uuid import UUID
+
+import asyncpg
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.db.indices import INDICES
+from app.db.manage_indices import create_indices
+from app.etl.extract import PRODUCERS, START_CHECKPOINT, PostgresExtractor, Producer
+from app.etl.load import ElasticLoader
+from app.etl.state import JsonFileState
+from app.etl.transform import DOCUMENTS, cache_tags, film_document
+from app.services import filmography, leaderboard
+from app.services.cache import invalidate_tags
+
+
+def get_checkpoint(state: JsonFileState, name: str) -> tuple[datetime, UUID]:
+    checkpoint = state.get(name)
+    if checkpoint is None:
+        return START_CHECKPOINT
+    return datetime.fromisoformat(checkpoint[0]), UUID(checkpoint[1])
+
+
+async def load(loader: ElasticLoader, redis: Redis, index: str, documents: list[dict]) -> None:
+    """
+    Записать документы и сбросить зависящие от них ключи кеша
+    (запись завершается обновлением индекса, поэтому кеш заполняется заново
+    уже новыми данными)
+    """
+    await loader.load(index, documents)
+    if index == "movies" and settings.leaderboard_enabled:
+        await leaderboard.update_films(redis, documents)
+    if index == "movies" and settings.filmography_enabled:
+        await filmography.update_films(redis, documents)
+    await invalidate_tags(redis, *cache_tags(index, documents))
+
+
+async def sync_producer(
+        name: str,
+        producer: Producer,
+        extractor: PostgresExtractor,
+        loader: ElasticLoader,
+        redis: Redis,
+        state: JsonFileState,
+) -> int:
+    """
+    Перенести изменения одной таблицы-источника; возвращает число строк
+    """
+    checkpoint = get_checkpoint(state, name)
+    synced = 0
+    while rows := await extractor.changed_rows(producer, checkpoint):
+        if producer.index:
+            build = DOCUMENTS[producer.index]
+            await load(loader, redis, producer.index, [build(row) for row in rows])
+
+        film_ids = await extractor.film_ids(producer, rows)
+        for start in range(0, len(film_ids), extractor.batch_size):
+            films = await extractor.films(film_ids[start:start + extractor.batch_size])
+            await load(loader, redis, "movies", [film_document(film) for film in films])
+
+        # Точка сдвигается только после успешной записи всей пачки
+        checkpoint = rows[-1]["checkpoint_at"], rows[-1]["id"]
+        state.set(name, [checkpoint[0].isoformat(), str(checkpoint[1])])
+        synced += len(rows)
+    return synced
+
+
+async def sync(
+        extractor: PostgresExtractor,
+        loader: ElasticLoader,
+        redis: Redis,
+        state: JsonFileState,
+) -> None:
+    for name, producer in PRODUCERS.items():
+        synced = await sync_producer(name, producer, extractor, loader, redis, state)
+        if synced:
+            logging.info(f"Synced {synced} changed rows of {producer.table}")
+
+
+async def build_indices(redis: Redis, es: AsyncElasticsearch) -> None:
+    """
+    Собрать рейтинги и индекс фильмографий в Redis, если их нет
+    """
+    rebuilds = []
+    if settings.leaderboard_enabled and not await leaderboard.leaderboard_exists(redis):
+        rebuilds.append(leaderboard.rebuild)
+    if settings.filmography_enabled and not await redis.exists(filmography.BUILT_KEY):
+        rebuilds.append(filmography.rebuild)
+    if rebuilds:
+        # Данные индекса видны поиску после обновления
+        await es.indices.refresh(index="movies")
+    for rebuild in rebuilds:
+        await rebuild(redis, es)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--once", action="store_true", help="sync once and exit")
+    args = parser.parse_args()
+
+    es = AsyncElasticsearch(hosts=[f"http://{settings.elastic_host}:{settings.elastic_port}"])
+    redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    pool = await asyncpg.create_pool(
+        host=settings.postgres_host,
+        port=settings.postgres_port,
+        database=settings.postgres_db,
+        user=settings.postgres_user,
+        password=settings.postgres_password,
+    )
+    extractor = PostgresExtractor(pool, settings.etl_batch_size)
+    loader = ElasticLoader(es, settings.etl_bulk_concurrency)
+    state = JsonFileState(settings.etl_state_file)
+    try:
+        await create_indices(es, list(INDICES))
+        while True:
+            try:
+                await sync(extractor, loader, redis, state)
+                await build_indices(redis, es)
+            except Exception as e:
+                if args.once:
+                    raise
+                logging.error(f"ETL sync failed, retrying: {e}")
+            if args.once:
+                break
+            await asyncio.sleep(settings.etl_sync_interval)
+    finally:
+        await pool.close()
+        await redis.close()
+        await es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
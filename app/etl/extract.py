@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from uuid import UUID
+
+import asyncpg
+
+# Контрольная точка до первой загрузки: берутся все строки
+START_CHECKPOINT = (datetime(1970, 1, 1, tzinfo=timezone.utc), UUID(int=0))
+
+
+@dataclass(frozen=True)
+class Producer:
+    """
+    Таблица-источник изменений: строки читаются по возрастанию
+    (timestamp_column, id), изменённые строки ведут к фильмам,
+    которые нужно пересобрать
+    """
+    table: str
+    timestamp_column: str
+    # SQL, возвращающий film_work_id по массиву id изменённых строк ($1);
+    # None - id изменённых строк сами являются id фильмов
+    film_ids_query: str | None = None
+    # Поле строки с id фильма (для таблиц связей)
+    film_id_column: str | None = None
+    # Индекс, в который строки таблицы загружаются сами по себе
+    index: str | None = None
+
+
+PRODUCERS = {
+    "genre": Producer(
+        table="content.genre",
+        timestamp_column="modified",
+        film_ids_query="SELECT DISTINCT film_work_id FROM content.genre_film_work "
+                       "WHERE genre_id = ANY($1::uuid[])",
+        index="genres",
+    ),
+    "person": Producer(
+        table="content.person",
+        timestamp_column="modified",
+        film_ids_query="SELECT DISTINCT film_work_id FROM content.person_film_work "
+                       "WHERE person_id = ANY($1::uuid[])",
+        index="persons",
+    ),
+    # В таблицах связей нет modified: новые связи находим по created
+    "genre_film_work": Producer(
+        table="content.genre_film_work",
+        timestamp_column="created",
+        film_id_column="film_work_id",
+    ),
+    "person_film_work": Producer(
+        table="content.person_film_work",
+        timestamp_column="created",
+        film_id_column="film_work_id",
+    ),
+    "film_work": Producer(
+        table="content.film_work",
+        timestamp_column="modified",
+    ),
+}
+
+# Фильмы целиком одним запросом: жанры и участники собираются
+# агрегатами по соединениям, а не отдельными запросами на каждый фильм
+FILMS_QUERY = """
+SELECT
+    fw.id,
+    fw.title,
+    fw.description,
+    fw.rating,
+    COALESCE(
+        jsonb_agg(DISTINCT jsonb_build_object('id', p.id, 'name', p.full_name, 'role', pfw.role))
+        FILTER (WHERE p.id IS NOT NULL),
+        '[]'
+    ) AS persons,
+    COALESCE(array_agg(DISTINCT g.name) FILTER (WHERE g.id IS NOT NULL), '{}') AS genres
+FROM content.film_work fw
+LEFT JOIN content.person_film_work pfw ON pfw.film_work_id = fw.id
+LEFT JOIN content.person p ON p.id = pfw.person_id
+LEFT JOIN content.genre_film_work gfw ON gfw.film_work_id = fw.id
+LEFT JOIN content.genre g ON g.id = gfw.genre_id
+WHERE fw.id = ANY($1::uuid[])
+GROUP BY fw.id
+"""
+
+
+class PostgresExtractor:
+    def __init__(self, pool: asyncpg.Pool, batch_size: int):
+        self.pool = pool
+        self.batch_size = batch_size
+
+    async def changed_rows(
+            self,
+            producer: Producer,
+            checkpoint: tuple[datetime, UUID],
+    ) -> list[asyncpg.Record]:
+        """
+        Следующая пачка строк, изменённых после контрольной точки.
+        Строки без отметки времени считаются изменёнными в начале эпохи
+        """
+        timestamp = f"COALESCE({producer.timestamp_column}, 'epoch'::timestamptz)"
+        query = (
+            f"SELECT *, {timestamp} AS checkpoint_at FROM {producer.table} "
+            f"WHERE ({timestamp}, id) > ($1, $2) "
+            f"ORDER BY {timestamp}, id LIMIT $3"
+        )
+        async with self.pool.acquire() as connection:
+            return await connection.fetch(query, *checkpoint, self.batch_size)
+
+    async def film_ids(self, producer: Producer, rows: list[asyncpg.Record]) -> list[UUID]:
+        """
+        Фильмы, затронутые изменёнными строками
+        """
+        if producer.film_id_column:
+            return list({row[producer.film_id_column] for row in rows})
+        if producer.film_ids_query is None:
+            return [row["id"] for row in rows]
+        async with self.pool.acquire() as connection:
+            records = await connection.fetch(producer.film_ids_query, [row["id"] for row in rows])
+        return [record["film_work_id"] for record in records]
+
+    async def films(self, film_ids: list[UUID]) -> list[asyncpg.Record]:
+        async with self.pool.acquire() as connection:
+            return await connection.fetch(FILMS_QUERY, film_ids)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import math
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
+
+
+class ElasticLoader:
+    """
+    Запись документов в Elasticsearch: пачка делится на части,
+    которые отправляются параллельными async_bulk
+    """
+
+    def __init__(self, es: AsyncElasticsearch, concurrency: int, chunk_size: int = 500):
+        self.es = es
+        self.concurrency = concurrency
+        self.chunk_size = chunk_size
+
+    async def load(self, index: str, documents: list[dict]) -> None:
+        if not documents:
+            return
+        part_size = max(self.chunk_size, math.ceil(len(documents) / self.concurrency))
+        parts = [documents[start:start + part_size] for start in range(0, len(documents), part_size)]
+        results = await asyncio.gather(*(self._bulk(index, part) for part in parts))
+        errors = [error for part_errors in results for error in part_errors]
+        if errors:
+            # Контрольная точка не сдвигается, пачка будет загружена повторно
+            raise RuntimeError(f"Failed to load {len(errors)} documents into {index}: {errors[:3]}")
+        # Документы становятся видны поиску только после обновления индекса.
+        # Без него кеш, сброшенный после записи, заново заполнился бы
+        # страницами из старого состояния индекса на полный TTL
+        await self.es.indices.refresh(index=index)
+        logging.info(f"Loaded {len(documents)} documents into {index}")
+
+    async def _bulk(self, index: str, documents: list[dict]) -> list:
+        _, errors = await async_bulk(
+            self.es,
+            ({"_index": index, "_id": document["id"], "_source": document} for document in documents),
+            chunk_size=self.chunk_size,
+            raise_on_error=False,
+        )
+        return errors
@@ -0,0 +1,31 @@
+import os
+from typing import Any
+
+import orjson
+
+
+class JsonFileState:
+    """
+    Состояние ETL (контрольные точки) в JSON-файле.
+    Файл перезаписывается атомарно, поэтому после падения процесса
+    загрузка продолжается с последней сохранённой точки
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._state: dict[str, Any] = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                self._state = orjson.loads(file.read() or b"{}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._state.get(key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        self._state[key] = value
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(orjson.dumps(self._state))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,76 @@
+import asyncpg
+import orjson
+
+from app.services.cache import entity_tag, genre_tag, list_tag, person_films_tag
+
+# Роль в content.person_film_work -> поле документа фильма
+ROLE_FIELDS = {
+    "director": "director",
+    "actor": "actors",
+    "writer": "writers",
+}
+
+
+def film_document(row: asyncpg.Record) -> dict:
+    """
+    Документ индекса movies в формате, который читают сервисы
+    """
+    document = {
+        "id": str(row["id"]),
+        "title": row["title"],
+        "description": row["description"],
+        "imdb_rating": row["rating"],
+        "genre": sorted(row["genres"]),
+        "director": [],
+        "actors": [],
+        "writers": [],
+    }
+    persons = row["persons"]
+    if isinstance(persons, str):
+        persons = orjson.loads(persons)
+    for person in sorted(persons, key=lambda person: person["name"]):
+        field = ROLE_FIELDS.get(person["role"])
+        if field:
+            document[field].append({"id": person["id"], "name": person["name"]})
+    document["actors_names"] = [actor["name"] for actor in document["actors"]]
+    document["writers_names"] = [writer["name"] for writer in document["writers"]]
+    return document
+
+
+def genre_document(row: asyncpg.Record) -> dict:
+    return {
+        "id": str(row["id"]),
+        "name": row["name"],
+        "description": row["description"],
+    }
+
+
+def person_document(row: asyncpg.Record) -> dict:
+    return {
+        "id": str(row["id"]),
+        "full_name": row["full_name"],
+    }
+
+
+def cache_tags(index: str, documents: list[dict]) -> list[str]:
+    """
+    Теги кеша API, которые устаревают после записи документов в индекс
+    """
+    tags = {list_tag(index)}
+    for document in documents:
+        tags.add(entity_tag(index, document["id"]))
+        if index == "movies":
+            tags.update(genre_tag(genre) for genre in document["genre"])
+            tags.update(
+                person_films_tag(person["id"])
+                for field in ROLE_FIELDS.values()
+                for person in document[field]
+            )
+    return sorted(tags)
+
+
+# Индекс -> сборка документа из строки таблицы-источника
+DOCUMENTS = {
+    "genres": genre_document,
+    "persons": person_document,
+}
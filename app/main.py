@@ -1,27 +1,52 @@
+import asyncio
 import uvicorn
 import logging
 
 from elasticsearch import AsyncElasticsearch
 from fastapi.responses import ORJSONResponse
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from http import HTTPStatus
 from redis.asyncio import Redis
 from contextlib import asynccontextmanager
 
+from app.api import health, metrics
 from app.api.v1 import films, genres, persons
 from app.core.config import settings
 from app.core.logger import LOGGING
 from app.db import elastic, redis
+from app.db.auto_pipeline import AutoPipelineRedis
+from app.services.cache import listen_invalidations, local_cache
+from app.services.genres import genres_dictionary
+from app.services.warmup import warm_up, warmup_state
+from app.utils.cursor import InvalidCursor
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis.redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    if settings.redis_autopipeline_enabled:
+        redis.redis = AutoPipelineRedis(redis.redis)
     elastic.es = AsyncElasticsearch(
         hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}']
     )
+    # Справочник жанров для обогащения фильмов держим актуальным в фоне
+    background_tasks = [
+        asyncio.create_task(genres_dictionary.keep_fresh(elastic.es)),
+    ]
+    # Локальный кеш воркера сбрасывается по сообщениям из Redis pub/sub
+    if local_cache is not None:
+        background_tasks.append(asyncio.create_task(listen_invalidations(redis.redis)))
+    # Прогрев идёт в фоне: воркер уже отвечает, но /api/health/ready
+    # сообщает о готовности только после прогрева
+    if settings.warmup_enabled:
+        background_tasks.append(asyncio.create_task(warm_up(redis.redis, elastic.es)))
+    else:
+        warmup_state.ready.set()
 
     yield
 
+    for task in background_tasks:
+        task.cancel()
     await redis.redis.close()
     await elastic.es.close()
 
@@ -34,9 +59,17 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor) -> ORJSONResponse:
+    return ORJSONResponse(status_code=HTTPStatus.BAD_REQUEST, content={"detail": str(exc)})
+
+
 app.include_router(films.router, prefix="/api/v1/films", tags=["films"])
 app.include_router(genres.router, prefix="/api/v1/genres", tags=["genres"])
 app.include_router(persons.router, prefix="/api/v1/persons", tags=["persons"])
+app.include_router(metrics.router, prefix="/api/metrics", tags=["metrics"])
+app.include_router(health.router, prefix="/api/health", tags=["health"])
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -1,5 +1,8 @@
+from functools import lru_cache
+
 import orjson
 from pydantic import BaseModel
+from pydantic.fields import SHAPE_SINGLETON
 
 
 def orjson_dumps(v, *, default):
@@ -24,3 +27,32 @@ class BaseFilm(BaseMixin):
     """
     title: str
     imdb_rating: float | None = None
+
+
+@lru_cache()
+def _nested_fields(model: type[BaseModel]) -> tuple[tuple[str, type[BaseModel], bool], ...]:
+    """
+    Поля модели, значения которых сами являются моделями: (имя, модель, список ли это)
+    """
+    return tuple(
+        (name, field.type_, field.shape != SHAPE_SINGLETON)
+        for name, field in model.__fields__.items()
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel)
+    )
+
+
+def construct_trusted(model: type[BaseModel], data: dict) -> BaseModel:
+    """
+    Собрать модель без повторной валидации из данных,
+    которые уже были проверены при записи (например, прочитанных из нашего кеша).
+    Значения остаются в JSON-типах: идентификаторы - строками.
+    """
+    for name, nested_model, is_list in _nested_fields(model):
+        value = data.get(name)
+        if value is None:
+            continue
+        if is_list:
+            data[name] = [construct_trusted(nested_model, item) for item in value]
+        else:
+            data[name] = construct_trusted(nested_model, value)
+    return model.construct(**data)
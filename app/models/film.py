@@ -62,3 +62,10 @@ class Films(BaseFilm):
     id: UUID
     title: str
     imdb_rating: Optional[float] = Query(ge=0, le=10)
+
+
+class PersonFilm(Films):
+    """
+    Фильм из фильмографии персоны с её ролями в нём
+    """
+    roles: List[str] = Field(default_factory=list)
@@ -1,81 +1,607 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
 from hashlib import md5
+from typing import Any, Awaitable, Callable
 
 import orjson
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import NotFoundError
+from pydantic import ValidationError
 from redis.asyncio import Redis
+from redis.exceptions import LockError, RedisError
 
-from app.models.base_model import BaseMixin
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.base_model import BaseMixin, construct_trusted
+from app.services.cache import (
+    NOT_FOUND, entity_tag, generations, local_cache, single_flight, tag_in_pipeline,
+)
+from app.utils.batcher import Batcher
+from app.utils.budget import ConcurrencyBudget
+from app.utils.cache_codec import decode_page, encode_page
+from app.utils.cursor import InvalidCursor, decode_cursor, encode_cursor
+from app.utils.tasks import run_in_background
 from uuid import UUID
 
+# Пакетировщики загрузок записей из Elasticsearch, по одному на индекс
+entity_batchers: dict[str, Batcher] = {}
+
+# Бюджет фоновых загрузок следующих страниц на воркер. Загрузка сверх бюджета
+# не ждёт очереди, а пропускается: предвыборка не должна конкурировать
+# с запросами клиентов за соединения с Elasticsearch
+prefetch_budget = ConcurrencyBudget(settings.prefetch_max_concurrency)
+# Признак фоновой загрузки: страница, загруженная заранее, не загружает следующую
+prefetching: ContextVar[bool] = ContextVar("prefetching", default=False)
+
 
 class BaseService:
     def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
         self.redis = redis
         self.elastic = elastic
         self.index_name = None
-        self.cache_timeout = 60 * 5  # 5 минут
+        self.cache_timeout = settings.cache_timeout
         self.model = BaseMixin
+        # Поле с уникальным значением, которое замыкает сортировку
+        # при курсорной пагинации, чтобы порядок записей был однозначным
+        self.tiebreaker_field = "id"
 
     async def get_by_id(self, _id: UUID) -> BaseMixin | None:
+        await self._refresh_generation()
         # Пытаемся получить данные из кеша, потому что оно работает быстрее
         entity = await self._entity_from_cache(_id=_id)
         if not entity:
             # Если записи нет в кеше, то ищем ее в Elasticsearch
-            entity = await self._get_entity_from_elastic(_id)
-            if not entity:
-                # Если она отсутствует в Elasticsearch, значит, записи вообще нет в базе
-                return None
-            # Сохраняем запись в кеш
-            await self._put_entity_to_cache(entity=entity)
+            # (одновременные промахи по той же записи ждут один запрос)
+            key = self._entity_cache_key(_id)
+            entity = await single_flight.do(
+                key,
+                lambda: self._fill_cache(
+                    key,
+                    lambda: self._load_entity(_id),
+                    lambda: self._entity_from_cache(_id=_id),
+                ),
+            )
 
+        # Отметка в кеше о том, что записи нет в Elasticsearch
+        if entity is NOT_FOUND:
+            return None
         return entity
 
+    async def get_many(self, ids: list[UUID]) -> list[BaseMixin | None]:
+        """
+        Получить записи по списку id в том же порядке, None - для ненайденных.
+        Кеш читается одним MGET, промахи загружаются одним mget из Elasticsearch
+        и сохраняются в кеш одним конвейером.
+        """
+        await self._refresh_generation()
+        keys = [self._entity_cache_key(_id) for _id in ids]
+        found = dict(zip(keys, await self._get_many_from_cache(
+            keys,
+            lambda data: construct_trusted(self.model, orjson.loads(data)),
+        )))
+
+        missing = list(dict.fromkeys(_id for _id, key in zip(ids, keys) if found[key] is None))
+        if missing:
+            entities = await self._get_entities_from_elastic(missing)
+            loaded = {_id: entities.get(str(_id)) for _id in missing}
+            await self._put_many_to_cache(loaded)
+            found.update(
+                (self._entity_cache_key(_id), entity) for _id, entity in loaded.items()
+            )
+
+        return [None if found[key] is NOT_FOUND else found[key] for key in keys]
+
+    async def _load_entity(self, _id: UUID) -> BaseMixin | None:
+        entity = await self._get_entity_from_elastic(_id)
+        if not entity:
+            # Если она отсутствует в Elasticsearch, значит, записи вообще нет в базе.
+            # Запоминаем это, чтобы повторные запросы не доходили до Elasticsearch
+            await self._put_not_found_to_cache(
+                self._entity_cache_key(_id),
+                # Отметку сбрасывает появление записи
+                tags=(entity_tag(self.index_name, _id),),
+            )
+            return None
+        # Сохраняем запись в кеш
+        await self._put_entity_to_cache(entity=entity)
+        return entity
+
+    async def _cached_entities(
+        self,
+        params: dict,
+        fetch: Callable[[], Awaitable[list[BaseMixin]]],
+        model: type[BaseMixin] | None = None,
+        tags: tuple[str, ...] = (),
+        member_index: str | None = None,
+    ) -> list[BaseMixin]:
+        """
+        Получить страницу списка из кеша, а при промахе загрузить её через fetch
+        (одновременные промахи по той же странице ждут один запрос).
+        Страница помечается тегами tags и тегами вошедших в неё записей
+        индекса member_index (по умолчанию - индекса сервиса)
+        """
+        await self._refresh_generation(member_index)
+        key = self._entities_cache_key(params, member_index)
+
+        def load() -> Awaitable[list[BaseMixin]]:
+            return self._fill_cache(
+                key,
+                lambda: self._load_entities(key, fetch, tags, member_index),
+                lambda: self._entities_from_cache(key, model),
+            )
+
+        entities = await self._entities_from_cache(
+            key,
+            model,
+            on_stale=lambda: self._revalidate(key, load),
+        )
+        if entities is not None:
+            return entities
+        return await single_flight.do(key, load)
+
+    async def _search_window_page(
+        self,
+        params: dict,
+        fetch_window: Callable[[int], Awaitable[list[BaseMixin] | None]],
+        page_size: int,
+        page_number: int,
+        tags: tuple[str, ...] = (),
+    ) -> list[BaseMixin] | None:
+        """
+        Страница поиска из окна первых id выдачи. Окно (список BaseMixin
+        с одними id в порядке релевантности) загружается через fetch_window
+        один раз на запрос и кешируется как страница списка, записи страницы
+        берутся из кеша записей. None - страница выходит за окно
+        и загружается обычным запросом
+        """
+        window_size = settings.search_window_size
+        start = (page_number - 1) * page_size
+        if start + page_size > window_size:
+            metrics.incr("search.window.misses")
+            return None
+
+        metrics.incr("search.window.hits")
+        window = await self._cached_entities(
+            {**params, "window": window_size},
+            lambda: fetch_window(window_size),
+            model=BaseMixin,
+            tags=tags,
+        )
+        page_ids = [entity.id for entity in window[start:start + page_size]]
+        if not page_ids:
+            return []
+        # Записи, удалённые после загрузки окна, пропускаются
+        return [entity for entity in await self.get_many(page_ids) if entity is not None]
+
+    def _prefetch_next_page(
+        self,
+        page: list,
+        page_size: int,
+        load_next: Callable[[], Awaitable[Any]],
+    ) -> None:
+        """
+        Загрузить следующую страницу в кеш в фоне, если текущая полная
+        и бюджет предвыборки не исчерпан
+        """
+        if not settings.prefetch_enabled or len(page) < page_size or prefetching.get():
+            return
+        # Слот занимается до запуска задачи: иначе страницы, загруженные
+        # в одном тике, все прошли бы проверку и встали в очередь
+        if not prefetch_budget.try_acquire():
+            metrics.incr("prefetch.skipped")
+            return
+        run_in_background(self._prefetch(load_next))
+
+    @staticmethod
+    async def _prefetch(load_next: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            prefetching.set(True)
+            metrics.incr("prefetch.started")
+            await load_next()
+        finally:
+            prefetch_budget.release()
+
+    def _revalidate(self, key: str, load: Callable[[], Awaitable[Any]]) -> None:
+        """
+        Обновить устаревшую запись в фоне, пока клиенту отдаётся старое значение
+        """
+        if not single_flight.is_running(key):
+            run_in_background(single_flight.do(key, load))
+
+    async def _load_entities(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[list[BaseMixin]]],
+        tags: tuple[str, ...] = (),
+        member_index: str | None = None,
+    ) -> list[BaseMixin]:
+        entities = await fetch()
+        if entities is None:
+            # Ошибка запроса к Elasticsearch: ничего не кешируем
+            return []
+        if entities:
+            member_index = member_index or self.index_name
+            await self._put_entities_to_cache(
+                entities,
+                key,
+                tags=(*tags, *(entity_tag(member_index, entity.id) for entity in entities)),
+            )
+        else:
+            await self._put_not_found_to_cache(key, tags)
+        return entities
+
+    async def _fill_cache(
+        self,
+        key: str,
+        load: Callable[[], Awaitable[Any]],
+        read_cached: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Заполнить ключ кеша под короткой блокировкой в Redis, чтобы при
+        истечении популярного ключа в Elasticsearch ходила одна реплика.
+        Остальные ждут её результат в кеше, а по истечении срока ожидания
+        идут в Elasticsearch сами.
+        """
+        if not settings.cache_fill_lock_enabled:
+            return await load()
+
+        lock = self.redis.lock(f"{key}:lock", timeout=settings.cache_fill_lock_timeout)
+        try:
+            acquired = await lock.acquire(blocking=False)
+        except RedisError as e:
+            logging.error(f"Failed to acquire cache fill lock {key}: {e}")
+            return await load()
+
+        if acquired:
+            try:
+                return await load()
+            finally:
+                try:
+                    await lock.release()
+                except LockError:
+                    # Аренда истекла раньше, чем закончилась загрузка
+                    pass
+
+        metrics.incr("cache.fill_lock.waits")
+        deadline = time.monotonic() + settings.cache_fill_wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(settings.cache_fill_poll_interval)
+            value = await read_cached()
+            if value is not None:
+                return value
+            # Победитель закончил, но ничего не положил в кеш
+            if not await lock.locked():
+                break
+        metrics.incr("cache.fill_lock.fallbacks")
+        return await load()
+
+    async def _refresh_generation(self, member_index: str | None = None) -> None:
+        """
+        Перечитать номера поколений индекса сервиса и индекса member_index,
+        если их локальные копии устарели
+        """
+        if settings.cache_generations_enabled:
+            await generations.refresh(self.redis, self.index_name)
+            if member_index and member_index != self.index_name:
+                await generations.refresh(self.redis, member_index)
+
+    def _cache_namespace(self, member_index: str | None = None) -> str:
+        # Нулевое поколение не пишется в ключ: ключи совпадают
+        # с ключами до включения поколений
+        namespace = self.index_name
+        generation = generations.get(self.index_name)
+        if generation:
+            namespace = f"{namespace}:g{generation}"
+        # Страница с записями другого индекса (фильмы персоны) устаревает
+        # и при смене его поколения
+        if member_index and member_index != self.index_name:
+            member_generation = generations.get(member_index)
+            if member_generation:
+                namespace = f"{namespace}:{member_index}:g{member_generation}"
+        return namespace
+
+    def _entity_cache_key(self, _id: UUID) -> str:
+        return f"{self._cache_namespace()}:{_id}"
+
+    def _entities_cache_key(self, params: dict, member_index: str | None = None) -> str:
+        return f"{self._cache_namespace(member_index)}:{md5(orjson.dumps(params)).hexdigest()}"
+
     async def _get_entity_from_elastic(self, _id: UUID) -> BaseMixin | None:
+        if settings.elastic_batch_enabled:
+            # Одновременные загрузки разных записей индекса уходят одним mget
+            return await self._entity_batcher().load(
+                str(_id),
+                self._get_entities_from_elastic,
+            )
+
         try:
-            doc = await self.elastic.get(index=self.index_name, id=_id)
+            doc = await self.elastic.get(index=self.index_name, id=str(_id))
         except NotFoundError:
             return None
-        return self.model(**doc["_source"])
+        return await self._build_entity(doc["_source"])
 
-    async def _entity_from_cache(self, _id: UUID) -> BaseMixin | None:
-        data = await self.redis.get(f"{self.index_name}:{_id}")
+    def _entity_batcher(self) -> Batcher:
+        batcher = entity_batchers.get(self.index_name)
+        if batcher is None:
+            batcher = entity_batchers[self.index_name] = Batcher(
+                f"elastic.batch.{self.index_name}",
+                window=settings.elastic_batch_window,
+                max_size=settings.elastic_batch_max_size,
+            )
+        return batcher
+
+    async def _get_entities_from_elastic(self, ids: list[UUID | str]) -> dict[str, BaseMixin]:
+        """
+        Загрузить записи одним mget: {id: запись} только для найденных.
+        Ошибка по любому документу (закрытый индекс, недоступный шард)
+        поднимается исключением: такие записи не считаются отсутствующими
+        """
+        try:
+            response = await self.elastic.mget(
+                index=self.index_name,
+                ids=[str(_id) for _id in ids],
+            )
+        except NotFoundError:
+            return {}
+
+        errors = [doc["error"] for doc in response["docs"] if "error" in doc]
+        if errors:
+            raise RuntimeError(
+                f"Failed to fetch {self.index_name} documents from Elasticsearch: {errors[0]}"
+            )
+
+        entities = {}
+        for doc in response["docs"]:
+            if not doc.get("found"):
+                continue
+            entity = await self._build_entity(doc["_source"])
+            if entity:
+                entities[doc["_id"]] = entity
+        return entities
+
+    async def _search_after(
+        self,
+        index: str,
+        body: dict,
+        sort: list[dict],
+        page_size: int,
+        cursor: str,
+    ) -> tuple[list[dict], str | None] | None:
+        """
+        Загрузить страницу документов по курсору через search_after.
+        Стоимость запроса не зависит от глубины страницы, в отличие от from/size.
+        Возвращает документы и курсор следующей страницы (None - страница последняя),
+        либо None при ошибке Elasticsearch
+        """
+        state = decode_cursor(cursor)
+        body = {
+            **body,
+            "size": page_size,
+            "sort": [*sort, {self.tiebreaker_field: "asc"}],
+        }
+        if "after" in state:
+            # Курсор выдан для другой сортировки (например, до её изменения)
+            if len(state["after"]) != len(body["sort"]):
+                raise InvalidCursor("cursor does not match the sort")
+            body["search_after"] = state["after"]
+
+        pit_id = state.get("pit")
+        try:
+            if not state and settings.cursor_pit_enabled:
+                # Первая страница: закрепляем обход за снимком индекса
+                pit = await self.elastic.open_point_in_time(
+                    index=index,
+                    keep_alive=settings.cursor_pit_keep_alive,
+                )
+                pit_id = pit["id"]
+            if pit_id:
+                body["pit"] = {"id": pit_id, "keep_alive": settings.cursor_pit_keep_alive}
+                response = await self.elastic.search(body=body)
+            else:
+                response = await self.elastic.search(index=index, body=body, request_cache=True)
+        except NotFoundError as e:
+            if pit_id:
+                raise InvalidCursor("cursor expired") from e
+            logging.error(f"Failed to fetch {index} page from Elasticsearch: {e}")
+            return None
+        except Exception as e:
+            logging.error(f"Failed to fetch {index} page from Elasticsearch: {e}")
+            return None
+
+        hits = response["hits"]["hits"]
+        pit_id = response.get("pit_id", pit_id)
+        if len(hits) < page_size:
+            if pit_id:
+                run_in_background(self.elastic.close_point_in_time(id=pit_id))
+            return hits, None
+        return hits, encode_cursor(hits[-1]["sort"], pit_id)
+
+    async def _build_entity(self, doc_source: dict) -> BaseMixin | None:
+        try:
+            return self.model(**doc_source)
+        except ValidationError as e:
+            logging.error(f"Error validating {self.index_name} data: {e}")
+            return None
+
+    async def _get_from_cache(
+        self,
+        key: str,
+        decode: Callable[[bytes], Any],
+        on_stale: Callable[[], None] | None = None,
+    ) -> Any | None:
+        """
+        Прочитать значение из кеша: сначала L1 воркера, затем Redis.
+        Если запись пережила мягкий TTL, вызывается on_stale.
+        """
+        if local_cache is not None:
+            value = local_cache.get(key)
+            if value is not None:
+                metrics.incr("cache.l1.hits")
+                return value
+            metrics.incr("cache.l1.misses")
+
+        if on_stale is not None and settings.cache_stale_while_revalidate:
+            # Остаток жизни ключа читаем в том же запросе к Redis
+            async with self.redis.pipeline(transaction=False) as pipe:
+                data, ttl = await pipe.get(key).pttl(key).execute()
+        else:
+            data, ttl = await self.redis.get(key), -1
         if not data:
+            metrics.incr("cache.redis.misses")
             return None
 
-        entity = self.model.parse_raw(data)
-        return entity
+        if data == NOT_FOUND:
+            metrics.incr("cache.redis.negative_hits")
+            value = NOT_FOUND
+        else:
+            metrics.incr("cache.redis.hits")
+            if on_stale is not None and 0 <= ttl < settings.cache_stale_timeout * 1000:
+                metrics.incr("cache.redis.stale_hits")
+                on_stale()
+            value = decode(data)
+        if local_cache is not None:
+            local_cache.set(key, value)
+        return value
+
+    async def _get_many_from_cache(
+        self,
+        keys: list[str],
+        decode: Callable[[bytes], Any],
+    ) -> list[Any | None]:
+        """
+        Прочитать несколько ключей: L1 воркера, затем оставшиеся одним MGET
+        """
+        values = [None] * len(keys)
+        if local_cache is not None:
+            for number, key in enumerate(keys):
+                values[number] = local_cache.get(key)
+            hits = sum(value is not None for value in values)
+            metrics.incr("cache.l1.hits", hits)
+            metrics.incr("cache.l1.misses", len(keys) - hits)
+
+        missing = [number for number, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+
+        for number, data in zip(missing, await self.redis.mget([keys[number] for number in missing])):
+            if not data:
+                metrics.incr("cache.redis.misses")
+                continue
+            if data == NOT_FOUND:
+                metrics.incr("cache.redis.negative_hits")
+                values[number] = NOT_FOUND
+            else:
+                metrics.incr("cache.redis.hits")
+                values[number] = decode(data)
+            if local_cache is not None:
+                local_cache.set(keys[number], values[number])
+        return values
+
+    async def _put_many_to_cache(self, entities: dict[UUID | str, BaseMixin | None]):
+        """
+        Сохранить записи {id: запись} одним конвейером;
+        None сохраняется как отметка «не найдено»
+        """
+        entities = {self._entity_cache_key(_id): (_id, entity) for _id, entity in entities.items()}
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, (_id, entity) in entities.items():
+                if entity is not None:
+                    timeout = self.cache_timeout
+                    pipe.set(key, entity.json(), timeout)
+                elif settings.cache_negative_timeout > 0:
+                    timeout = settings.cache_negative_timeout
+                    pipe.set(key, NOT_FOUND, timeout)
+                else:
+                    continue
+                if settings.cache_tags_enabled:
+                    tag_in_pipeline(pipe, key, (entity_tag(self.index_name, _id),), timeout)
+            await pipe.execute()
+
+        if local_cache is not None:
+            for key, (_, entity) in entities.items():
+                if entity is not None:
+                    local_cache.set(key, entity, self.cache_timeout)
+                elif settings.cache_negative_timeout > 0:
+                    local_cache.set(key, NOT_FOUND, settings.cache_negative_timeout)
+
+    async def _put_to_cache(
+        self,
+        key: str,
+        value: Any,
+        data: bytes | str,
+        timeout: int | None = None,
+        tags: tuple[str, ...] = (),
+    ):
+        timeout = timeout or self.cache_timeout
+        if settings.cache_tags_enabled and tags:
+            # Значение и его теги записываются одним конвейером
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.set(key, data, timeout)
+                tag_in_pipeline(pipe, key, tags, timeout)
+                await pipe.execute()
+        else:
+            await self.redis.set(key, data, timeout)
+        if local_cache is not None:
+            local_cache.set(key, value, timeout)
+
+    async def _put_not_found_to_cache(self, key: str, tags: tuple[str, ...] = ()):
+        if settings.cache_negative_timeout > 0:
+            await self._put_to_cache(
+                key, NOT_FOUND, NOT_FOUND, settings.cache_negative_timeout, tags,
+            )
+
+    async def _entity_from_cache(self, _id: UUID) -> BaseMixin | bytes | None:
+        return await self._get_from_cache(
+            self._entity_cache_key(_id),
+            # Данные в кеш пишет сам сервис после валидации, повторно не проверяем
+            lambda data: construct_trusted(self.model, orjson.loads(data)),
+        )
 
     async def _entities_from_cache(
         self,
-        params: dict,
-    ) -> list[BaseMixin]:
-        params = md5(orjson.dumps(params)).hexdigest()
-        data = await self.redis.get(f"{self.index_name}:{params}")
-        if not data:
+        key: str,
+        model: type[BaseMixin] | None = None,
+        on_stale: Callable[[], None] | None = None,
+    ) -> list[BaseMixin] | None:
+        """
+        Получить страницу из кеша: None, если её нет в кеше,
+        и пустой список для закешированной пустой страницы
+        """
+        model = model or self.model
+        entities = await self._get_from_cache(
+            key,
+            lambda data: [construct_trusted(model, item) for item in decode_page(data)],
+            on_stale,
+        )
+        if entities is NOT_FOUND:
             return []
-
-        data = orjson.loads(data)
-        entities = [self.model(**orjson.loads(entity)) for entity in data]
         return entities
 
     async def _put_entity_to_cache(self, entity: BaseMixin):
-        await self.redis.set(
-            f'{self.index_name}:{entity.id}',
+        await self._put_to_cache(
+            self._entity_cache_key(entity.id),
+            entity,
             entity.json(),
-            self.cache_timeout,
+            tags=(entity_tag(self.index_name, entity.id),),
         )
 
     async def _put_entities_to_cache(
         self,
         entities: list[BaseMixin],
-        params: dict,
+        key: str,
+        tags: tuple[str, ...] = (),
     ):
-        entities = [entity.json() for entity in entities]
-        data = orjson.dumps(entities)
-        params = md5(orjson.dumps(params)).hexdigest()
-        await self.redis.set(
-            f"{self.index_name}:{params}",
+        data = encode_page(entities, settings.cache_compress_threshold)
+        timeout = self.cache_timeout
+        if settings.cache_stale_while_revalidate:
+            # Жёсткий TTL: после мягкого запись ещё живёт в устаревшем состоянии
+            timeout += settings.cache_stale_timeout
+        await self._put_to_cache(
+            key,
+            entities,
             data,
-            self.cache_timeout,
+            timeout,
+            tags,
         )
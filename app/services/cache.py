@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import time
+
+import orjson
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.utils.generations import Generations
+from app.utils.local_cache import LocalCache
+from app.utils.single_flight import SingleFlight
+
+# Канал, через который воркеры сообщают друг другу об инвалидированных ключах
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Значение в кеше для записи, которой нет в Elasticsearch, или пустой страницы.
+# Отличается от отсутствия ключа, то есть от «нет в кеше»
+NOT_FOUND = b"null"
+
+# Префикс сортированных множеств Redis с ключами кеша, помеченными тегом;
+# вес ключа - время, когда он истекает
+TAG_PREFIX = "tags:"
+
+# Локальный кеш (L1) воркера перед Redis, включается настройкой
+local_cache: LocalCache | None = LocalCache(
+    maxsize=settings.l1_cache_size,
+    ttl=settings.l1_cache_ttl,
+) if settings.l1_cache_enabled else None
+
+# Поколения пространств имён кеша: увеличение номера сбрасывает весь индекс
+generations = Generations(ttl=settings.cache_generation_ttl)
+
+# Одновременные промахи по одному ключу кеша превращаются в один запрос в Elasticsearch
+single_flight = SingleFlight("cache.single_flight")
+
+
+async def invalidate(redis: Redis, *keys: str) -> None:
+    """
+    Удалить ключи из Redis и из локальных кешей всех воркеров
+    """
+    if not keys:
+        return
+    await redis.delete(*keys)
+    if local_cache is not None:
+        local_cache.delete(*keys)
+    await redis.publish(INVALIDATION_CHANNEL, orjson.dumps(keys))
+
+
+def entity_tag(index: str, _id) -> str:
+    """
+    Тег записи: её собственный ключ и страницы списков, в которые она входит
+    """
+    return f"{index}:{_id}"
+
+
+def list_tag(index: str) -> str:
+    """
+    Тег страниц списков и поиска по индексу без фильтров
+    """
+    return f"{index}:lists"
+
+
+def genre_tag(genre: str) -> str:
+    """
+    Тег страниц фильмов, отфильтрованных по жанру
+    """
+    return f"genre:{genre.casefold()}"
+
+
+def person_films_tag(person_id) -> str:
+    """
+    Тег страниц фильмов персоны
+    """
+    return f"person_films:{person_id}"
+
+
+def _expired_before() -> float:
+    # Запись, прочитанная из Redis незадолго до истечения,
+    # ещё до L1_CACHE_TTL секунд живёт в локальных кешах воркеров
+    return time.time() - (settings.l1_cache_ttl if local_cache is not None else 0)
+
+
+def tag_in_pipeline(pipe, key: str, tags: tuple[str, ...], timeout: int) -> None:
+    """
+    Добавить в конвейер запись ключа, живущего timeout секунд, в множества
+    тегов. Заодно из множеств убираются уже истёкшие ключи: множества
+    популярных тегов обновляются постоянно и иначе росли бы без предела.
+    Множество живёт не меньше самой долгоживущей записи кеша,
+    поэтому TTL у всех множеств один
+    """
+    tag_timeout = max(
+        settings.cache_timeout + settings.cache_stale_timeout,
+        settings.response_cache_timeout,
+    )
+    expires_at = time.time() + timeout
+    expired_before = _expired_before()
+    for tag in tags:
+        tag_key = f"{TAG_PREFIX}{tag}"
+        pipe.zadd(tag_key, {key: expires_at})
+        pipe.zremrangebyscore(tag_key, "-inf", expired_before)
+        pipe.expire(tag_key, tag_timeout)
+
+
+async def invalidate_tags(redis: Redis, *tags: str) -> None:
+    """
+    Удалить все ключи кеша, помеченные любым из тегов
+    (вызывается загрузчиком данных после изменений)
+    """
+    if not tags:
+        return
+    tag_keys = [f"{TAG_PREFIX}{tag}" for tag in tags]
+    expired_before = _expired_before()
+    # Чтение и удаление множеств атомарны: ключ, помеченный в это время,
+    # останется в множестве для следующей инвалидации. Истёкшие ключи не читаются
+    async with redis.pipeline(transaction=True) as pipe:
+        for tag_key in tag_keys:
+            pipe.zrangebyscore(tag_key, expired_before, "+inf")
+        *members, _ = await pipe.delete(*tag_keys).execute()
+    keys = {key.decode() for tag_members in members for key in tag_members}
+    await invalidate(redis, *keys)
+
+
+async def listen_invalidations(redis: Redis) -> None:
+    """
+    Слушать канал инвалидации и вычищать ключи из локального кеша
+    (запускается в lifespan приложения)
+    """
+    while True:
+        pubsub = redis.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    local_cache.delete(*orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Cache invalidation listener failed: {e}")
+        finally:
+            await pubsub.reset()
+        # Пока подписка не восстановлена, L1 может отдавать устаревшие данные
+        local_cache.clear()
+        await asyncio.sleep(1)
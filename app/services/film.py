@@ -1,18 +1,48 @@
 import logging
 from functools import lru_cache
 
-from elasticsearch import AsyncElasticsearch, NotFoundError
+import orjson
+from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
 from pydantic import ValidationError
 from redis.asyncio import Redis
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.elastic import get_elastic
 from app.db.redis import get_redis
+from app.models.base_model import BaseMixin
 from app.models.film import Film, Films
 from app.services.base import BaseService
+from app.services.cache import genre_tag, list_tag
+from app.services.genres import genres_dictionary
+from app.services.leaderboard import brief_key, leaderboard_page
+from app.utils.query_params import normalize_query, normalize_sort, normalize_text
 from uuid import UUID
 
 FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 минут
 
+# Поля документа фильма, которые нужны для списков (модель Films):
+# описание, персоны и жанры из Elasticsearch не передаются
+FILMS_SOURCE_FIELDS = ["title", "imdb_rating"]
+
+# Поле для точного фильтра по жанру (keyword, см. app.db.indices)
+GENRE_FILTER_FIELD = "genre"
+
+# Сортировка, для которой в Redis ведутся рейтинги фильмов
+LEADERBOARD_SORT = "-imdb_rating"
+
+
+def normalize_films_params(genre: str | None,
+                           sort: str | None) -> tuple[str | None, str | None]:
+    """
+    Жанр в написании из справочника и сортировка без знака «+»:
+    одинаковые запросы к Elasticsearch получают один ключ кеша
+    """
+    genre = normalize_text(genre)
+    if genre is not None:
+        genre = genres_dictionary.canonical_name(genre)
+    return genre, normalize_sort(sort)
+
 
 class FilmService(BaseService):
     def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
@@ -27,37 +57,20 @@ class FilmService(BaseService):
         :return:
         """
 
-        # Пытаемся получить данные из кеша, потому что оно работает быстрее
-        film = await self._entity_from_cache(film_id)
-        if not film:
-            # Если фильма нет в кеше, то ищем его в Elasticsearch
-            film = await self._get_film_from_elastic(film_id)
-            if not film:
-                # Если он отсутствует в Elasticsearch, значит, фильма вообще нет в базе
-                return None
-            # Сохраняем фильм в кеш
-            await self._put_entity_to_cache(film)
-        return film
-
-    async def _get_film_from_elastic(self, film_id: UUID) -> Film | None:
-        try:
-            doc = await self.elastic.get(index="movies", id=str(film_id))
-        except NotFoundError:
-            return None
-
-        doc_source = doc["_source"]
-
-        director_names = doc_source.get('director', [])
-
-        if director_names:
-            prepared = {
-                'uuid': director_names['id'],
-                'full_name': director_names['name']
-            }
+        return await super().get_by_id(film_id)
 
-            doc_source['director'] = [prepared]
-        else:
-            doc_source['director'] = []
+    async def _build_entity(self, doc_source: dict) -> Film | None:
+        """
+        Подготовить документ фильма из Elasticsearch к модели Film
+        """
+        directors = doc_source.get('director') or []
+        # ETL проекта пишет список режиссёров, прежний ETL - одного режиссёра
+        if isinstance(directors, dict):
+            directors = [directors]
+        doc_source['director'] = [
+            {'uuid': director['id'], 'full_name': director['name']}
+            for director in directors
+        ]
 
         # Получаем данные о жанрах, используя выделенную функцию
         genre_names = doc_source.get('genre', [])
@@ -97,25 +110,7 @@ class FilmService(BaseService):
         :param genre_names:
         :return:
         """
-        genres_data = []
-        for genre_name in genre_names:
-            try:
-                response = await self.elastic.search(
-                    index="genres",
-                    body={
-                        "query": {
-                            "match": {
-                                "name": genre_name
-                            }
-                        }
-                    }
-                )
-                for hit in response['hits']['hits']:
-                    genre_source = hit["_source"]
-                    genres_data.append({"name": genre_source["name"], "uuid": hit["_id"]})
-            except NotFoundError:
-                logging.error(f"Genre {genre_name} not found")
-        return genres_data
+        return await genres_dictionary.resolve(self.elastic, genre_names)
 
     async def get_films(self, genre: str | None = None,
                         sort: str | None = None,
@@ -126,6 +121,7 @@ class FilmService(BaseService):
         Получить список фильмов с учетом жанра, сортировки, размера страницы и номера страницы.
         Возвращает список объектов Film.
         """
+        genre, sort = normalize_films_params(genre, sort)
         params = {
             "genre": genre,
             "sort": sort,
@@ -133,18 +129,80 @@ class FilmService(BaseService):
             "page_number": page_number
         }
 
-        cached_films = await self._entities_from_cache(params)
-        if cached_films:
-            return cached_films
+        films = None
+        if settings.leaderboard_enabled and sort == LEADERBOARD_SORT:
+            films = await self._films_from_leaderboard(genre, page_size, page_number)
+        if films is None:
+            # Запрос данных в Elasticsearch, если они не найдены в кеше
+            films = await self._cached_entities(
+                params,
+                lambda: self._get_films_from_elastic(genre, sort, page_size, page_number),
+                model=Films,
+                tags=(genre_tag(genre) if genre else list_tag(self.index_name),),
+            )
+        self._prefetch_next_page(
+            films,
+            page_size,
+            lambda: self.get_films(genre, sort, page_size, page_number + 1),
+        )
+        return films
 
-        # Запрос данных, если они не найдены в кеше
-        films = await self._get_films_from_elastic(genre, sort, page_size, page_number)
+    async def _films_from_leaderboard(self, genre: str | None,
+                                      page_size: int,
+                                      page_number: int) -> list[Films] | None:
+        """
+        Страница фильмов по убыванию рейтинга из рейтинга в Redis.
+        None - рейтинга нет в Redis
+        """
+        film_ids = await leaderboard_page(self.redis, genre, page_size, page_number)
+        if film_ids is None:
+            metrics.incr("leaderboard.misses")
+            return None
+        metrics.incr("leaderboard.hits")
+        return await self.get_briefs(film_ids)
 
-        # Кеширование данных, если они были получены
-        if films:
-            await self._put_entities_to_cache(films, params)
+    async def get_briefs(self, film_ids: list[str]) -> list[Films]:
+        """
+        Краткие записи фильмов для списков в порядке film_ids: одним MGET
+        из Redis, недостающие - одним mget из Elasticsearch (в Redis они
+        пишутся на время жизни кеша). Ненайденные фильмы пропускаются
+        """
+        if not film_ids:
+            return []
 
-        return films
+        keys = [brief_key(film_id) for film_id in film_ids]
+        films = {}
+        for film_id, data in zip(film_ids, await self.redis.mget(keys)):
+            if not data:
+                continue
+            # Краткие записи пишет и загрузчик данных, поэтому они проверяются;
+            # некорректная запись загружается заново из Elasticsearch
+            try:
+                films[film_id] = Films(**orjson.loads(data))
+            except ValidationError as e:
+                logging.error(f"Error validating film brief {film_id}: {e}")
+        missing = [film_id for film_id in film_ids if film_id not in films]
+        if missing:
+            loaded = await self._get_briefs_from_elastic(missing)
+            if loaded:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for film in loaded:
+                        pipe.set(brief_key(film.id), film.json(), ex=self.cache_timeout)
+                    await pipe.execute()
+            films.update((str(film.id), film) for film in loaded)
+        return [films[film_id] for film_id in film_ids if film_id in films]
+
+    async def _get_briefs_from_elastic(self, film_ids: list[str]) -> list[Films]:
+        try:
+            response = await self.elastic.mget(
+                index=self.index_name,
+                ids=film_ids,
+                _source=FILMS_SOURCE_FIELDS,
+            )
+        except Exception as e:
+            logging.error(f"Failed to fetch films from Elasticsearch: {e}")
+            return []
+        return self._films_from_hits([doc for doc in response["docs"] if doc.get("found")])
 
     async def search_films(
             self, query: str,
@@ -153,42 +211,140 @@ class FilmService(BaseService):
         """
         Поиск фильмов по заданному запросу.
         """
+        query = normalize_query(query)
+        films = await self._search_films_page(query, page_size, page_number)
+        self._prefetch_next_page(
+            films,
+            page_size,
+            lambda: self.search_films(query, page_size, page_number + 1),
+        )
+        return films
+
+    async def _search_films_page(self, query: str,
+                                 page_size: int,
+                                 page_number: int) -> list[Films]:
+        if settings.search_window_enabled:
+            films = await self._search_window_page(
+                {"query": query},
+                lambda size: self._search_film_ids_from_elastic(query, size),
+                page_size,
+                page_number,
+                tags=(list_tag(self.index_name),),
+            )
+            if films is not None:
+                # Фильмы окна могли прийти из кеша без проверки: краткие записи проверяются
+                page = []
+                for film in films:
+                    try:
+                        page.append(Films(id=film.id, title=film.title, imdb_rating=film.imdb_rating))
+                    except ValidationError as e:
+                        logging.error(f"Error validating film data: {e}")
+                return page
+
         params = {
             "query": query,
             "page_size": page_size,
             "page_number": page_number
         }
-        cached_films = await self._entities_from_cache(params)
-        if cached_films:
-            return cached_films
-
-        films = await self._search_films_from_elastic(query, page_size, page_number)
-        if films:
-            await self._put_entities_to_cache(films, params)
-
-        return films
+        return await self._cached_entities(
+            params,
+            lambda: self._search_films_from_elastic(query, page_size, page_number),
+            model=Films,
+            tags=(list_tag(self.index_name),),
+        )
+
+    async def get_films_by_cursor(self, genre: str | None = None,
+                                  sort: str | None = None,
+                                  page_size: int = 10,
+                                  cursor: str = ""
+                                  ) -> tuple[list[Films], str | None]:
+        """
+        Получить страницу списка фильмов по курсору.
+        Возвращает фильмы и курсор следующей страницы (None - страница последняя).
+        Страницы по курсору не кешируются.
+        """
+        genre, sort = normalize_films_params(genre, sort)
+        query_body, sort_body = self._films_query(genre, sort)
+        page = await self._search_after("movies", query_body, sort_body, page_size, cursor)
+        if page is None:
+            return [], None
+        hits, next_cursor = page
+        return self._films_from_hits(hits), next_cursor
+
+    async def search_films_by_cursor(
+            self, query: str,
+            page_size: int = 10,
+            cursor: str = "") -> tuple[list[Films], str | None]:
+        """
+        Поиск фильмов по заданному запросу с пагинацией по курсору.
+        """
+        query = normalize_query(query)
+        page = await self._search_after(
+            "movies",
+            self._search_films_query(query),
+            [{"_score": "desc"}],
+            page_size,
+            cursor,
+        )
+        if page is None:
+            return [], None
+        hits, next_cursor = page
+        return self._films_from_hits(hits), next_cursor
 
     async def _get_films_from_elastic(self, genre: str | None = None,
                                       sort: str | None = None,
                                       page_size: int = 10,
                                       page_number: int = 1
-                                      ) -> list[Films]:
+                                      ) -> list[Films] | None:
         offset = (page_number - 1) * page_size
+        query_body, sort_body = self._films_query(genre, sort)
+        query_body.update({
+            "sort": sort_body,
+            "from": offset,  # Смещение для пагинации
+            "size": page_size  # Размер страницы
+        })
+
+        try:
+            response = await self.elastic.search(
+                index="movies",
+                body=query_body,
+                # Результат зависит только от запроса и данных индекса
+                request_cache=True,
+            )
+        except Exception as e:
+            logging.error(f"Failed to fetch films from Elasticsearch: {e}")
+            return None
+
+        return self._films_from_hits(response['hits']['hits'])
+
+    @staticmethod
+    def _films_query(genre: str | None = None,
+                     sort: str | None = None) -> tuple[dict, list[dict]]:
+        """
+        Запрос и сортировка для списка фильмов
+        """
         query_body = {
             "query": {
                 "bool": {
-                    "must": []
+                    "filter": []
                 }
             },
-            "sort": [],
-            "from": offset,  # Смещение для пагинации
-            "size": page_size  # Размер страницы
+            "_source": FILMS_SOURCE_FIELDS
         }
+        sort_body = []
 
-        # Фильтрация по жанру
+        # Фильтрация по жанру: точное совпадение в контексте фильтра
+        # без подсчёта релевантности, такой фильтр кешируется в Elasticsearch
         if genre:
-            query_body["query"]["bool"]["must"].append({
-                "match": {"genre": genre}
+            if genres_dictionary.is_known(genre):
+                genre_filter = genres_dictionary.canonical_name(genre)
+            else:
+                # Справочник ещё не загружен или не знает жанр: написание в индексе
+                # неизвестно, поэтому сравниваем без учёта регистра, чтобы не
+                # получить (и не закешировать) пустую страницу из-за регистра
+                genre_filter = {"value": genre, "case_insensitive": True}
+            query_body["query"]["bool"]["filter"].append({
+                "term": {GENRE_FILTER_FIELD: genre_filter}
             })
 
         # Сортировка
@@ -197,44 +353,19 @@ class FilmService(BaseService):
             field_name = "imdb_rating" \
                 if sort[1:] == ("imdb_rating" or sort == "imdb_rating") \
                 else sort[1:] if order == "desc" else sort
-            query_body["sort"].append({
+            sort_body.append({
                 field_name: {"order": order}
             })
 
-        try:
-            response = await self.elastic.search(index="movies", body=query_body)
-        except Exception as e:
-            logging.error(f"Failed to fetch films from Elasticsearch: {e}")
-            return []
-
-        films = []
-        for hit in response['hits']['hits']:
-            film_data = {
-                "id": hit["_id"],
-                "title": hit["_source"]["title"],
-                "imdb_rating": hit["_source"].get("imdb_rating")
-            }
-            try:
-                film = Films(**film_data)
-                films.append(film)
-            except ValidationError as e:
-                logging.error(f"Error validating film data: {e}")
-                continue
-
-        return films
+        return query_body, sort_body
 
     async def _search_films_from_elastic(
             self, query: str,
             page_size: int = 10,
-            page_number: int = 1) -> list[Films]:
+            page_number: int = 1) -> list[Films] | None:
         offset = (page_number - 1) * page_size
         search_body = {
-            "query": {
-                "multi_match": {
-                    "query": query,
-                    "fields": ["title^5", "description"]
-                }
-            },
+            **self._search_films_query(query),
             "from": offset,
             "size": page_size
         }
@@ -243,10 +374,40 @@ class FilmService(BaseService):
             response = await self.elastic.search(index="movies", body=search_body)
         except Exception as e:
             logging.error(f"Failed to search films in Elasticsearch: {e}")
-            return []
+            return None
+
+        return self._films_from_hits(response['hits']['hits'])
+
+    async def _search_film_ids_from_elastic(self, query: str,
+                                            size: int) -> list[BaseMixin] | None:
+        """
+        Id первых size фильмов выдачи поиска, без документов
+        """
+        search_body = {**self._search_films_query(query), "_source": False, "size": size}
+        try:
+            response = await self.elastic.search(index="movies", body=search_body)
+        except Exception as e:
+            logging.error(f"Failed to search films in Elasticsearch: {e}")
+            return None
+
+        return [BaseMixin(id=hit["_id"]) for hit in response['hits']['hits']]
+
+    @staticmethod
+    def _search_films_query(query: str) -> dict:
+        return {
+            "query": {
+                "multi_match": {
+                    "query": query,
+                    "fields": ["title^5", "description"]
+                }
+            },
+            "_source": FILMS_SOURCE_FIELDS
+        }
 
+    @staticmethod
+    def _films_from_hits(hits: list[dict]) -> list[Films]:
         films = []
-        for hit in response['hits']['hits']:
+        for hit in hits:
             film_data = {
                 "id": hit["_id"],
                 "title": hit["_source"]["title"],
@@ -0,0 +1,165 @@
+"""
+Обратный индекс фильмографий в Redis: для каждой персоны - сортированное
+множество id её фильмов с рейтингом со знаком минус в качестве веса
+(по возрастанию веса фильмы идут по убыванию рейтинга, а с равным
+рейтингом - по возрастанию id, как в Elasticsearch) и хеш ролей персоны
+в каждом фильме, для каждого фильма - множество id его участников (чтобы
+при изменении состава убрать фильм из фильмографий выбывших персон).
+Страница фильмов персоны - чтение диапазона и ролей одним конвейером,
+краткие записи фильмов - одним MGET (app.services.leaderboard).
+
+Индекс ведёт загрузчик данных (app.etl): собирает его полностью, если его
+нет, и обновляет по изменённым фильмам. Пока отметки о сборке нет,
+фильмы персоны загружаются из Elasticsearch.
+"""
+import logging
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+from redis.asyncio import Redis
+
+from app.services.leaderboard import rating_score, set_brief
+
+FILMOGRAPHY_PREFIX = "filmography:"
+# Отметка о том, что индекс собран полностью. Номер меняется вместе
+# с форматом индекса: без отметки загрузчик собирает его заново
+BUILT_KEY = f"{FILMOGRAPHY_PREFIX}built:2"
+# Поле документа фильма -> роль участника
+ROLE_LABELS = {
+    "director": "director",
+    "actors": "actor",
+    "writers": "writer",
+}
+# Число фильмов в одном конвейере при полной сборке
+REBUILD_CHUNK_SIZE = 1000
+
+
+def filmography_key(person_id) -> str:
+    return f"{FILMOGRAPHY_PREFIX}person:{person_id}"
+
+
+def roles_key(person_id) -> str:
+    return f"{FILMOGRAPHY_PREFIX}person:{person_id}:roles"
+
+
+def film_persons_key(film_id) -> str:
+    return f"{FILMOGRAPHY_PREFIX}film:{film_id}"
+
+
+def filmography_score(rating: float | None) -> float:
+    # Фильмы без рейтинга - в конце списка
+    return -rating_score(rating)
+
+
+def film_roles(film: dict) -> dict[str, list[str]]:
+    """
+    Роли участников фильма: {id персоны: [роли]}
+    """
+    roles: dict[str, list[str]] = {}
+    for field, label in ROLE_LABELS.items():
+        persons = film.get(field) or []
+        # Прежний ETL писал одного режиссёра объектом, а не списком
+        if isinstance(persons, dict):
+            persons = [persons]
+        for person in persons:
+            person_roles = roles.setdefault(str(person["id"]), [])
+            if label not in person_roles:
+                person_roles.append(label)
+    return roles
+
+
+async def filmography_page(
+        redis: Redis,
+        person_id,
+        page_size: int,
+        page_number: int,
+) -> list[tuple[str, list[str]]] | None:
+    """
+    Фильмы персоны по убыванию рейтинга и возрастанию id с её ролями:
+    [(id фильма, [роли])].
+    None - индекс ещё не собран
+    """
+    start = (page_number - 1) * page_size
+    async with redis.pipeline(transaction=False) as pipe:
+        built, film_ids = await (
+            pipe.exists(BUILT_KEY)
+            .zrange(filmography_key(person_id), start, start + page_size - 1)
+            .execute()
+        )
+    if not built:
+        return None
+    if not film_ids:
+        return []
+    roles = await redis.hmget(roles_key(person_id), film_ids)
+    return [
+        (film_id.decode(), labels.decode().split(",") if labels else [])
+        for film_id, labels in zip(film_ids, roles)
+    ]
+
+
+def _add_film(pipe, film: dict, roles: dict[str, list[str]]) -> None:
+    film_id = film["id"]
+    score = filmography_score(film.get("imdb_rating"))
+    for person_id, person_roles in roles.items():
+        pipe.zadd(filmography_key(person_id), {film_id: score})
+        pipe.hset(roles_key(person_id), film_id, ",".join(person_roles))
+    pipe.delete(film_persons_key(film_id))
+    if roles:
+        pipe.sadd(film_persons_key(film_id), *roles)
+
+
+async def update_films(redis: Redis, films: list[dict]) -> None:
+    """
+    Обновить фильмографии участников изменённых фильмов.
+    До полной сборки индекс не обновляется, краткие записи фильмов
+    переписываются всегда: без рейтингов их больше никто не обновляет
+    """
+    if not films:
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.exists(BUILT_KEY)
+        for film in films:
+            set_brief(pipe, film)
+            pipe.smembers(film_persons_key(film["id"]))
+        built, *results = await pipe.execute()
+    if not built:
+        return
+    previous = results[1::2]
+
+    async with redis.pipeline(transaction=False) as pipe:
+        for film, old_persons in zip(films, previous):
+            roles = film_roles(film)
+            for person_id in {person_id.decode() for person_id in old_persons} - roles.keys():
+                pipe.zrem(filmography_key(person_id), film["id"])
+                pipe.hdel(roles_key(person_id), film["id"])
+            _add_film(pipe, film, roles)
+        await pipe.execute()
+
+
+async def rebuild(redis: Redis, elastic: AsyncElasticsearch, index: str = "movies") -> int:
+    """
+    Собрать индекс заново по всем фильмам. На время сборки отметка
+    снимается, и сервис читает фильмы персон из Elasticsearch
+    """
+    await redis.delete(BUILT_KEY)
+    stale_keys = [key async for key in redis.scan_iter(match=f"{FILMOGRAPHY_PREFIX}*", count=1000)]
+    for start in range(0, len(stale_keys), REBUILD_CHUNK_SIZE):
+        await redis.unlink(*stale_keys[start:start + REBUILD_CHUNK_SIZE])
+
+    films = 0
+    pipe = redis.pipeline(transaction=False)
+    async for hit in async_scan(
+        elastic,
+        index=index,
+        query={"_source": ["imdb_rating", *(f"{field}.id" for field in ROLE_LABELS)]},
+        size=REBUILD_CHUNK_SIZE,
+    ):
+        film = {**hit["_source"], "id": hit["_id"]}
+        _add_film(pipe, film, film_roles(film))
+        films += 1
+        if films % REBUILD_CHUNK_SIZE == 0:
+            await pipe.execute()
+    await pipe.execute()
+    await redis.set(BUILT_KEY, 1)
+    logging.info(f"Rebuilt filmography index: {films} films")
+    return films
@@ -1,73 +1,194 @@
+import asyncio
 import logging
+import time
 from fastapi import Depends
-from uuid import UUID
 from app.models.genre import Genre
 from app.db.redis import get_redis
 from app.db.elastic import get_elastic
 from redis.asyncio import Redis
 from elasticsearch import AsyncElasticsearch
 from elasticsearch.exceptions import NotFoundError
+from app.core.config import settings
 from app.services.base import BaseService
+from app.services.cache import list_tag
 from pydantic import ValidationError
 
+# Жанров немного, поэтому справочник целиком загружается одним запросом
+GENRES_DICTIONARY_SIZE = 1000
 
-class GenreService(BaseService):
-    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
-        super().__init__(redis, elastic)
-        self.model = Genre
-        self.index_name = "genres"
+# Поля документа жанра для списка жанров
+GENRES_SOURCE_FIELDS = ["name", "description"]
+
+
+class GenresDictionary:
+    """
+    Справочник жанров в памяти процесса: имя жанра -> {name, uuid}.
+    Обновляется в фоне, поэтому обогащение фильма жанрами
+    не требует отдельного запроса в Elasticsearch на каждый жанр.
+    """
+
+    def __init__(
+            self,
+            index_name: str = "genres",
+            refresh_interval: int = 60,
+            unknown_ttl: float = 5,
+    ):
+        self.index_name = index_name
+        self.refresh_interval = refresh_interval
+        self.unknown_ttl = unknown_ttl
+        self._genres: dict[str, dict] = {}
+        # Имена, которых не нашлось в индексе: имя -> момент, до которого
+        # их не ищем повторно. Короткий срок, чтобы жанр, добавленный
+        # загрузчиком данных, не ждал полного обновления справочника
+        self._unknown: dict[str, float] = {}
+
+    async def refresh(self, elastic: AsyncElasticsearch) -> None:
+        """
+        Загрузить справочник жанров целиком
+        """
+        response = await elastic.search(
+            index=self.index_name,
+            body={
+                "query": {"match_all": {}},
+                "_source": ["name"],
+                "size": GENRES_DICTIONARY_SIZE
+            }
+        )
+        self._genres = {
+            hit["_source"]["name"].casefold(): {
+                "name": hit["_source"]["name"],
+                "uuid": hit["_id"]
+            } for hit in response['hits']['hits']
+        }
+        self._unknown = {}
+
+    async def keep_fresh(self, elastic: AsyncElasticsearch) -> None:
+        """
+        Периодически обновлять справочник (запускается в lifespan приложения)
+        """
+        while True:
+            try:
+                await self.refresh(elastic)
+            except NotFoundError:
+                logging.warning(f"Index {self.index_name} not found")
+            except Exception as e:
+                logging.error(f"Failed to refresh genres dictionary: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def resolve(
+            self,
+            elastic: AsyncElasticsearch,
+            genre_names: list[str]
+    ) -> list[dict]:
+        """
+        Получить данные о жанрах по их именам.
+        Неизвестные справочнику имена догружаются одним общим запросом.
+        """
+        now = time.monotonic()
+        unknown = [
+            name for name in genre_names
+            if name.casefold() not in self._genres
+            and self._unknown.get(name.casefold(), 0) <= now
+        ]
+        if unknown:
+            await self._load_names(elastic, unknown)
+
+        genres_data = []
+        for genre_name in genre_names:
+            genre_data = self._genres.get(genre_name.casefold())
+            if genre_data:
+                genres_data.append(genre_data)
+        return genres_data
 
-    async def get_by_id(self, genre_id: UUID) -> Genre | None:
-        genre = await self._entity_from_cache(_id=genre_id)
+    def is_known(self, genre_name: str) -> bool:
+        return genre_name.casefold() in self._genres
 
-        if not genre:
-            genre = await self._get_entity_from_elastic(_id=genre_id)
-            if not genre:
-                return None
-            await self._put_entity_to_cache(entity=genre)
-        return genre
+    def canonical_name(self, genre_name: str) -> str:
+        """
+        Имя жанра в том написании, в котором оно хранится в индексе.
+        Неизвестное справочнику имя возвращается как есть
+        """
+        genre_data = self._genres.get(genre_name.casefold())
+        return genre_data["name"] if genre_data else genre_name
 
-    async def _get_entity_from_elastic(self, _id: UUID) -> Genre | None:
+    async def _load_names(self, elastic: AsyncElasticsearch, genre_names: list[str]):
+        found = {}
         try:
-            doc = await self.elastic.get(index=self.index_name, id=_id)
+            response = await elastic.search(
+                index=self.index_name,
+                body={
+                    "query": {
+                        "bool": {
+                            "should": [
+                                {"match_phrase": {"name": name}} for name in genre_names
+                            ]
+                        }
+                    },
+                    "_source": ["name"],
+                    "size": len(genre_names) * 10
+                }
+            )
+            for hit in response['hits']['hits']:
+                name = hit["_source"]["name"]
+                found[name.casefold()] = {"name": name, "uuid": hit["_id"]}
         except NotFoundError:
-            return None
-        return self.model(**doc["_source"])
-
-    async def _entity_from_cache(self, _id: UUID) -> Genre | None:
-        data = await self.redis.get(f"{self.index_name}:{_id}")
-        if not data:
-            return None
-        return self.model.parse_raw(data)
-
-    async def _put_entity_to_cache(self, entity: Genre):
-        await self.redis.set(
-            f"{self.index_name}:{entity.id}",
-            entity.json(),
-            self.cache_timeout
-        )
+            logging.error(f"Genres {genre_names} not found")
+
+        self._genres.update(found)
+        expires_at = time.monotonic() + self.unknown_ttl
+        for genre_name in genre_names:
+            if genre_name.casefold() not in found:
+                self._unknown[genre_name.casefold()] = expires_at
+
+
+genres_dictionary = GenresDictionary(
+    refresh_interval=settings.genres_refresh_interval,
+    unknown_ttl=settings.genres_unknown_ttl,
+)
+
+
+class GenreService(BaseService):
+    def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
+        super().__init__(redis, elastic)
+        self.model = Genre
+        self.index_name = "genres"
 
     async def list_genres(self, page_size: int, page_number: int) -> list[Genre]:
         params = {"page_size": page_size, "page_number": page_number}
-        cached_genres = await self._entities_from_cache(params)
-        if not cached_genres:
-            cached_genres = await self._get_genres_from_elastic(page_size, page_number)
-            if cached_genres:
-                await self._put_entities_to_cache(cached_genres, params)
-        return cached_genres
+        return await self._cached_entities(
+            params,
+            lambda: self._get_genres_from_elastic(page_size, page_number),
+            tags=(list_tag(self.index_name),),
+        )
+
+    async def list_genres_by_cursor(self, page_size: int,
+                                    cursor: str = "") -> tuple[list[Genre], str | None]:
+        """
+        Страница жанров по курсору и курсор следующей страницы
+        """
+        page = await self._search_after(
+            self.index_name, {"_source": GENRES_SOURCE_FIELDS}, [], page_size, cursor)
+        if page is None:
+            return [], None
+        hits, next_cursor = page
+        return self._genres_from_hits(hits), next_cursor
 
     async def _get_genres_from_elastic(self, page_size: int, page_number: int) -> list[Genre]:
         offset = (page_number - 1) * page_size
         try:
             response = await self.elastic.search(
                 index=self.index_name,
-                body={"from": offset, "size": page_size}
+                body={"from": offset, "size": page_size, "_source": GENRES_SOURCE_FIELDS}
             )
         except NotFoundError:
             return []
 
+        return self._genres_from_hits(response['hits']['hits'])
+
+    @staticmethod
+    def _genres_from_hits(hits: list[dict]) -> list[Genre]:
         genres = []
-        for hit in response['hits']['hits']:
+        for hit in hits:
             genres_data = {
                 "id": hit["_id"],
                 "name": hit["_source"]["name"],
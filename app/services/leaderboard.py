@@ -0,0 +1,145 @@
+"""
+Рейтинги фильмов в Redis: сортированные множества id фильмов с рейтингом
+в качестве веса, общее и по каждому жанру, и краткие записи фильмов для
+списков. Страница списка по убыванию рейтинга - один ZREVRANGE и один MGET.
+
+Рейтинги ведёт загрузчик данных (app.etl): полностью строит их, если их нет,
+и обновляет по изменённым фильмам после записи каждой пачки. Пока рейтинга
+нет, список загружается из Elasticsearch.
+"""
+import logging
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_scan
+from redis.asyncio import Redis
+
+LEADERBOARD_KEY = "leaderboard:movies:imdb_rating"
+# Множество ключей рейтингов по жанрам
+GENRE_LEADERBOARDS_KEY = f"{LEADERBOARD_KEY}:genres"
+BRIEF_PREFIX = "movies:brief:"
+# Поля краткой записи фильма (модель Films)
+BRIEF_FIELDS = ["id", "title", "imdb_rating"]
+# Число фильмов в одном конвейере при полной сборке
+REBUILD_CHUNK_SIZE = 1000
+
+
+def leaderboard_key(genre: str | None = None) -> str:
+    if genre is None:
+        return LEADERBOARD_KEY
+    return f"{LEADERBOARD_KEY}:genre:{genre.casefold()}"
+
+
+def brief_key(film_id) -> str:
+    return f"{BRIEF_PREFIX}{film_id}"
+
+
+def rating_score(rating: float | None) -> float:
+    # Фильмы без рейтинга - в конце списка, как при сортировке в Elasticsearch
+    return float("-inf") if rating is None else rating
+
+
+def set_brief(pipe, film: dict) -> None:
+    """
+    Добавить в конвейер запись краткой записи фильма
+    """
+    pipe.set(brief_key(film["id"]), orjson.dumps({field: film.get(field) for field in BRIEF_FIELDS}))
+
+
+async def leaderboard_page(
+        redis: Redis,
+        genre: str | None,
+        page_size: int,
+        page_number: int,
+) -> list[str] | None:
+    """
+    Id фильмов страницы по убыванию рейтинга, None - рейтинга нет в Redis
+    """
+    key = leaderboard_key(genre)
+    start = (page_number - 1) * page_size
+    async with redis.pipeline(transaction=False) as pipe:
+        exists, ids = await pipe.exists(key).zrevrange(key, start, start + page_size - 1).execute()
+    if not exists:
+        return None
+    return [film_id.decode() for film_id in ids]
+
+
+async def leaderboard_exists(redis: Redis) -> bool:
+    return bool(await redis.exists(LEADERBOARD_KEY))
+
+
+def _add_film(pipe, film: dict, leaderboard: str = LEADERBOARD_KEY, suffix: str = "") -> set[str]:
+    """
+    Добавить в конвейер запись фильма в рейтинги; возвращает ключи жанровых рейтингов
+    """
+    score = rating_score(film.get("imdb_rating"))
+    pipe.zadd(leaderboard + suffix, {film["id"]: score})
+    genre_keys = set()
+    for genre in film.get("genre") or []:
+        genre_key = leaderboard_key(genre)
+        pipe.zadd(genre_key + suffix, {film["id"]: score})
+        genre_keys.add(genre_key)
+    set_brief(pipe, film)
+    return genre_keys
+
+
+async def update_films(redis: Redis, films: list[dict]) -> None:
+    """
+    Обновить рейтинги по изменённым документам фильмов.
+    Пока рейтинги не собраны полностью, они не обновляются:
+    частичный рейтинг отдавал бы неполные страницы
+    """
+    if not films or not await leaderboard_exists(redis):
+        return
+    genre_keys = {key.decode() for key in await redis.smembers(GENRE_LEADERBOARDS_KEY)}
+    async with redis.pipeline(transaction=False) as pipe:
+        for film in films:
+            # Жанры фильма могли измениться: убираем его из всех жанровых рейтингов
+            for genre_key in genre_keys:
+                pipe.zrem(genre_key, film["id"])
+            new_keys = _add_film(pipe, film)
+            if new_keys:
+                pipe.sadd(GENRE_LEADERBOARDS_KEY, *new_keys)
+        await pipe.execute()
+
+
+async def rebuild(redis: Redis, elastic: AsyncElasticsearch, index: str = "movies") -> int:
+    """
+    Собрать рейтинги заново по всем фильмам индекса. Рейтинги собираются
+    во временных ключах и подменяют прежние переименованием
+    """
+    suffix = ":rebuild"
+    old_keys = {key.decode() for key in await redis.smembers(GENRE_LEADERBOARDS_KEY)}
+    genre_keys: set[str] = set()
+    await redis.delete(LEADERBOARD_KEY + suffix, *(key + suffix for key in old_keys))
+
+    films = 0
+    pipe = redis.pipeline(transaction=False)
+    async for hit in async_scan(
+        elastic,
+        index=index,
+        query={"_source": ["title", "imdb_rating", "genre"]},
+        size=REBUILD_CHUNK_SIZE,
+    ):
+        genre_keys |= _add_film(pipe, {**hit["_source"], "id": hit["_id"]}, suffix=suffix)
+        films += 1
+        if films % REBUILD_CHUNK_SIZE == 0:
+            await pipe.execute()
+    await pipe.execute()
+
+    async with redis.pipeline(transaction=True) as pipe:
+        if films:
+            pipe.rename(LEADERBOARD_KEY + suffix, LEADERBOARD_KEY)
+        else:
+            pipe.delete(LEADERBOARD_KEY)
+        for key in genre_keys:
+            pipe.rename(key + suffix, key)
+        stale_keys = old_keys - genre_keys
+        if stale_keys:
+            pipe.delete(*stale_keys)
+        pipe.delete(GENRE_LEADERBOARDS_KEY)
+        if genre_keys:
+            pipe.sadd(GENRE_LEADERBOARDS_KEY, *genre_keys)
+        await pipe.execute()
+    logging.info(f"Rebuilt rating leaderboards: {films} films, {len(genre_keys)} genres")
+    return films
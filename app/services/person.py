@@ -7,21 +7,39 @@ from fastapi import Depends
 from pydantic import ValidationError
 from redis.asyncio import Redis
 
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.db.elastic import get_elastic
 from app.db.redis import get_redis
+from app.models.base_model import BaseMixin, construct_trusted
 from app.models.persons import BasePersonModel
-from app.models.film import Films
+from app.models.film import PersonFilm
 from app.services.base import BaseService
+from app.services.cache import list_tag, person_films_tag
+from app.services.film import FILMS_SOURCE_FIELDS, FilmService
+from app.services.filmography import film_roles, filmography_page
+from app.utils.query_params import normalize_query
 from uuid import UUID
 
 FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 минут
 
+# Поля документа фильма со списками участников
+PERSON_ROLES = ["director", "actors", "writers"]
+
+# Порядок фильмов персоны, как в обратном индексе фильмографий
+# (app.services.filmography): по убыванию рейтинга, при равном - по id
+PERSON_FILMS_SORT = [{"imdb_rating": "desc"}, {"id": "asc"}]
+
+# Поля документа персоны для поиска (модель BasePersonModel)
+PERSONS_SOURCE_FIELDS = ["id", "full_name"]
+
 
 class PersonsService(BaseService):
     def __init__(self, redis: Redis, elastic: AsyncElasticsearch):
         super().__init__(redis, elastic)
         self.model = BasePersonModel
         self.index_name = "persons"
+        self.film_service = FilmService(redis, elastic)
 
     async def _person_from_cache(self, person_id: UUID) -> BasePersonModel | None:
         data = await self.redis.get(person_id)
@@ -36,63 +54,122 @@ class PersonsService(BaseService):
 
     async def get_films(self, person_id: UUID,
                         page_size: int = 10,
-                        page_number: int = 1) -> List[Films]:
-        self.model = Films
+                        page_number: int = 1) -> List[PersonFilm]:
+        if settings.filmography_enabled:
+            films = await self._films_from_filmography(person_id, page_size, page_number)
+            if films is not None:
+                return films
 
         params = {'person_id': str(person_id),
                   'page_size': page_size,
                   'page_number': page_number}
 
-        cached_films = await self._entities_from_cache(params)
-        if cached_films:
-            return cached_films
-
-        persons = await self._get_persons_from_elastic(person_id, page_size, page_number)
-        if persons:
-            await self._put_entities_to_cache(persons, params)
-        return persons
+        return await self._cached_entities(
+            params,
+            lambda: self._get_persons_from_elastic(person_id, page_size, page_number),
+            model=PersonFilm,
+            tags=(person_films_tag(person_id),),
+            member_index='movies',
+        )
+
+    async def _films_from_filmography(self, person_id: UUID,
+                                      page_size: int,
+                                      page_number: int) -> List[PersonFilm] | None:
+        """
+        Страница фильмов персоны из обратного индекса в Redis: id и роли
+        одним конвейером, краткие записи фильмов одним MGET.
+        None - индекс ещё не собран
+        """
+        page = await filmography_page(self.redis, person_id, page_size, page_number)
+        if page is None:
+            metrics.incr("filmography.misses")
+            return None
+        metrics.incr("filmography.hits")
+        roles = dict(page)
+        return [
+            construct_trusted(PersonFilm, {
+                "id": film.id, "title": film.title, "imdb_rating": film.imdb_rating,
+                "roles": roles[str(film.id)],
+            })
+            for film in await self.film_service.get_briefs(list(roles))
+        ]
+
+    async def get_films_by_cursor(self, person_id: UUID,
+                                  page_size: int = 10,
+                                  cursor: str = "") -> tuple[List[PersonFilm], str | None]:
+        """
+        Страница фильмов персоны по курсору и курсор следующей страницы
+        """
+        # id замыкает сортировку сам (tiebreaker_field)
+        page = await self._search_after(
+            'movies', self._person_films_query(person_id), PERSON_FILMS_SORT[:-1], page_size, cursor)
+        if page is None:
+            return [], None
+        hits, next_cursor = page
+        return self._films_from_hits(hits, person_id), next_cursor
 
     async def _get_persons_from_elastic(self, person_id: UUID,
                                         page_size: int = 10,
-                                        page_number: int = 1) -> List[Films]:
+                                        page_number: int = 1) -> List[PersonFilm] | None:
 
         offset = (page_number - 1) * page_size
         query_body = {
-            "query": {
-                "bool": {
-                    "should": [
-                        {
-                            "match": {"director.id": str(person_id)}
-                        },
-                        {
-                            "match": {"actors.id": str(person_id)}
-                        },
-                        {
-                            "match": {"writers.id": str(person_id)}
-                        }
-                    ]
-                }
-            },
+            **self._person_films_query(person_id),
+            "sort": PERSON_FILMS_SORT,
             "from": offset,
             "size": page_size
         }
 
         try:
-            response = await self.elastic.search(index='movies', body=query_body)
+            response = await self.elastic.search(
+                index='movies',
+                body=query_body,
+                # Результат зависит только от запроса и данных индекса
+                request_cache=True,
+            )
         except Exception as e:
             logging.error(f"Failed to fetch persons from Elasticsearch: {e}")
             logging.error(query_body)
-            return []
+            return None
 
+        return self._films_from_hits(response['hits']['hits'], person_id)
+
+    @staticmethod
+    def _person_films_query(person_id: UUID) -> dict:
+        # Участие персоны в фильме - точное совпадение id в контексте фильтра:
+        # релевантность не считается, а фильтр кешируется в Elasticsearch
+        return {
+            "query": {
+                "bool": {
+                    "filter": [
+                        {
+                            "bool": {
+                                "should": [
+                                    {"term": {f"{role}.id": str(person_id)}}
+                                    for role in PERSON_ROLES
+                                ],
+                                "minimum_should_match": 1
+                            }
+                        }
+                    ]
+                }
+            },
+            # id участников - чтобы определить роли персоны в фильме
+            "_source": [*FILMS_SOURCE_FIELDS, *(f"{role}.id" for role in PERSON_ROLES)]
+        }
+
+    @staticmethod
+    def _films_from_hits(hits: list[dict], person_id: UUID) -> List[PersonFilm]:
         films = []
-        for hit in response['hits']['hits']:
+        for hit in hits:
             film_data = {
                 "id": hit["_id"],
                 "title": hit["_source"]["title"],
-                "imdb_rating": hit["_source"].get("imdb_rating")
+                "imdb_rating": hit["_source"].get("imdb_rating"),
+                "roles": film_roles(hit["_source"]).get(str(person_id), []),
             }
             try:
-                film = Films(**film_data)
+                film = PersonFilm(**film_data)
                 films.append(film)
             except ValidationError as e:
                 logging.error(f"Error validating person data: {e}")
@@ -103,47 +180,107 @@ class PersonsService(BaseService):
     async def search_person(self, query: str,
                             page_size: int = 10,
                             page_number: int = 1) -> list[BasePersonModel]:
+        query = normalize_query(query)
+        persons = await self._search_person_page(query, page_size, page_number)
+        self._prefetch_next_page(
+            persons,
+            page_size,
+            lambda: self.search_person(query, page_size, page_number + 1),
+        )
+        return persons
 
-        params = {"query": query, "page_size": page_size, "page_number": page_number}
-        cached_persons = await self._entities_from_cache(params)
-        if cached_persons:
-            return cached_persons
-
-        persons = await self._search_persons_from_elastic(query, page_size, page_number)
-        if persons:
-            await self._put_entities_to_cache(persons, params)
+    async def _search_person_page(self, query: str,
+                                  page_size: int,
+                                  page_number: int) -> list[BasePersonModel]:
+        if settings.search_window_enabled:
+            persons = await self._search_window_page(
+                {"query": query},
+                lambda size: self._search_person_ids_from_elastic(query, size),
+                page_size,
+                page_number,
+                tags=(list_tag(self.index_name),),
+            )
+            if persons is not None:
+                return persons
 
-        return persons
+        params = {"query": query, "page_size": page_size, "page_number": page_number}
+        return await self._cached_entities(
+            params,
+            lambda: self._search_persons_from_elastic(query, page_size, page_number),
+            tags=(list_tag(self.index_name),),
+        )
+
+    async def search_person_by_cursor(self, query: str,
+                                      page_size: int = 10,
+                                      cursor: str = ""
+                                      ) -> tuple[list[BasePersonModel], str | None]:
+        """
+        Поиск персон с пагинацией по курсору
+        """
+        query = normalize_query(query)
+        page = await self._search_after(
+            self.index_name,
+            self._search_persons_query(query),
+            [{"_score": "desc"}] if query else [],
+            page_size,
+            cursor,
+        )
+        if page is None:
+            return [], None
+        hits, next_cursor = page
+        return self._persons_from_hits(hits), next_cursor
 
     async def _search_persons_from_elastic(self, query: str,
                                            page_size: int = 10,
                                            page_number: int = 1
-                                           ) -> list[BasePersonModel]:
+                                           ) -> list[BasePersonModel] | None:
         offset = (page_number - 1) * page_size
         search_body = {
             "from": offset,
             "size": page_size,
-            "query": {
-                "match_all": {}
-            }
+            **self._search_persons_query(query)
         }
 
-        if query:
-            search_body["query"] = {
-                "multi_match": {
-                    "query": query,
-                    "fields": ["full_name"]
-                }
-            }
+        try:
+            response = await self.elastic.search(index=self.index_name, body=search_body)
+        except Exception as e:
+            logging.error(f"Failed to search persons in Elasticsearch: {e}")
+            return None
+
+        return self._persons_from_hits(response['hits']['hits'])
 
+    async def _search_person_ids_from_elastic(self, query: str,
+                                              size: int) -> list[BaseMixin] | None:
+        """
+        Id первых size персон выдачи поиска, без документов
+        """
+        search_body = {**self._search_persons_query(query), "_source": False, "size": size}
         try:
             response = await self.elastic.search(index=self.index_name, body=search_body)
         except Exception as e:
             logging.error(f"Failed to search persons in Elasticsearch: {e}")
-            return []
+            return None
+
+        return [BaseMixin(id=hit['_id']) for hit in response['hits']['hits']]
+
+    @staticmethod
+    def _search_persons_query(query: str) -> dict:
+        if query:
+            return {
+                "query": {
+                    "multi_match": {
+                        "query": query,
+                        "fields": ["full_name"]
+                    }
+                },
+                "_source": PERSONS_SOURCE_FIELDS
+            }
+        return {"query": {"match_all": {}}, "_source": PERSONS_SOURCE_FIELDS}
 
+    @staticmethod
+    def _persons_from_hits(hits: list[dict]) -> list[BasePersonModel]:
         persons = []
-        for hit in response['hits']['hits']:
+        for hit in hits:
             try:
                 person = BasePersonModel(**hit['_source'])
                 persons.append(person)
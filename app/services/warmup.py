@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.film import FilmService
+from app.services.genres import GenreService
+
+# Размер страницы, которой загружаются все жанры
+GENRES_PAGE_SIZE = 100
+# Паузы между повторами загрузок, которые не получили данных, секунды
+RETRY_DELAY = 0.5
+RETRY_MAX_DELAY = 5
+# Размер страницы фильмов, которую прогревает get_films по умолчанию
+FILMS_PAGE_SIZE = 10
+
+
+class WarmupState:
+    """
+    Ход прогрева кеша воркера. Воркер готов принимать трафик, когда
+    прогрета доля ready_ratio загрузок или истёк бюджет времени прогрева.
+    Прогретой считается только загрузка, которая получила данные
+    """
+
+    def __init__(self, ready_ratio: float):
+        self.ready_ratio = ready_ratio
+        self.total = 0
+        self.done = 0
+        self.ready = asyncio.Event()
+
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+    def finish_one(self) -> None:
+        self.done += 1
+        self._check()
+
+    def skip(self, count: int) -> None:
+        """
+        Убрать из плана загрузки, которые оказались не нужны
+        (страницы после последней неполной)
+        """
+        self.total -= count
+        self._check()
+
+    def _check(self) -> None:
+        if self.total and self.progress() >= self.ready_ratio:
+            self.ready.set()
+
+    def snapshot(self) -> dict:
+        return {"ready": self.ready.is_set(), "done": self.done, "total": self.total}
+
+
+warmup_state = WarmupState(ready_ratio=settings.warmup_ready_ratio)
+
+
+async def warm_up(redis: Redis, elastic: AsyncElasticsearch) -> None:
+    """
+    Прогреть кеш и Elasticsearch запросами, которые первыми приходят
+    после выкладки: все жанры, первые страницы фильмов по рейтингу
+    (всех и каждого жанра) и популярные фильмы из WARMUP_FILM_IDS.
+    Готовность выставляется по достижении доли WARMUP_READY_RATIO загрузок,
+    получивших данные (оставшиеся загрузки продолжаются, а не получившие
+    данных до этого повторяются), и в любом случае через WARMUP_TIMEOUT
+    секунд, когда незавершённый прогрев прерывается
+    """
+    started = time.monotonic()
+    try:
+        await asyncio.wait_for(_warm_up(redis, elastic), timeout=settings.warmup_timeout)
+    except asyncio.TimeoutError:
+        logging.warning(
+            f"Cache warm-up budget exceeded: {warmup_state.done} of {warmup_state.total} loads done"
+        )
+    except Exception as e:
+        logging.error(f"Cache warm-up failed: {e}")
+    else:
+        logging.info(f"Cache warm-up finished in {time.monotonic() - started:.1f}s")
+    finally:
+        warmup_state.ready.set()
+
+
+async def _warm_up(redis: Redis, elastic: AsyncElasticsearch) -> None:
+    film_service = FilmService(redis, elastic)
+    genre_service = GenreService(redis, elastic)
+    semaphore = asyncio.Semaphore(settings.warmup_concurrency)
+
+    async def run(load: Callable[[], Awaitable[list]]) -> list:
+        """
+        Выполнить загрузку; загрузка без данных повторяется, пока воркер не готов
+        """
+        delay = RETRY_DELAY
+        while True:
+            async with semaphore:
+                try:
+                    result = await load()
+                except Exception as e:
+                    metrics.incr("warmup.failures")
+                    logging.error(f"Cache warm-up load failed: {e}")
+                    result = []
+            # Сервисы отдают ошибку Elasticsearch пустым ответом,
+            # поэтому загрузка без данных готовность не приближает
+            if any(item is not None for item in result):
+                warmup_state.finish_one()
+                return result
+            if warmup_state.ready.is_set():
+                return result
+            metrics.incr("warmup.retries")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    async def warm_films(genre: str | None) -> None:
+        for page_number in range(1, settings.warmup_film_pages + 1):
+            films = await run(lambda: film_service.get_films(
+                genre=genre, sort="-imdb_rating", page_number=page_number,
+            ))
+            if films and len(films) < FILMS_PAGE_SIZE:
+                # Страница последняя: следующие прогревать нечем
+                warmup_state.skip(settings.warmup_film_pages - page_number)
+                return
+
+    genres = await _list_genres(genre_service)
+    film_lists = [None, *(genre.name for genre in genres)]
+    warmup_state.total = len(film_lists) * settings.warmup_film_pages + bool(settings.warmup_film_ids)
+    loads = [warm_films(genre) for genre in film_lists]
+    if settings.warmup_film_ids:
+        loads.append(run(lambda: film_service.get_many(settings.warmup_film_ids)))
+    await asyncio.gather(*loads)
+
+
+async def _list_genres(genre_service: GenreService) -> list:
+    """
+    Все страницы жанров: их имена нужны для списков фильмов по жанру.
+    Пока Elasticsearch недоступен, попытки повторяются в пределах бюджета прогрева
+    """
+    delay = RETRY_DELAY
+    while True:
+        try:
+            genres = []
+            page_number = 1
+            while True:
+                page = await genre_service.list_genres(GENRES_PAGE_SIZE, page_number)
+                genres.extend(page)
+                if len(page) < GENRES_PAGE_SIZE:
+                    return genres
+                page_number += 1
+        except Exception as e:
+            metrics.incr("warmup.failures")
+            logging.error(f"Cache warm-up genres listing failed, retrying in {delay}s: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RETRY_MAX_DELAY)
@@ -0,0 +1,88 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable
+
+from app.core.metrics import metrics
+from app.utils.tasks import run_in_background
+
+
+class Batcher:
+    """
+    Микробатчинг: одиночные загрузки по разным ключам, пришедшие в течение
+    короткого окна, объединяются в одну пакетную загрузку. Пакет уходит
+    по истечении окна или сразу, как только набрано max_size ключей
+    """
+
+    def __init__(self, name: str, window: float, max_size: int):
+        self.name = name
+        self.window = window
+        self.max_size = max_size
+        self._pending: dict[str, tuple[asyncio.Future, float]] = {}
+        self._load_many: Callable[[list[str]], Awaitable[dict[str, Any]]] | None = None
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def load(
+        self,
+        key: str,
+        load_many: Callable[[list[str]], Awaitable[dict[str, Any]]],
+    ) -> Any:
+        """
+        Загрузить значение по ключу в составе ближайшего пакета.
+        load_many получает список ключей и возвращает {ключ: значение}
+        только для найденных, для остальных результат - None.
+        Пакет загружается функцией первого вызова в окне
+        """
+        pending = self._pending.get(key)
+        if pending is None:
+            future = asyncio.get_running_loop().create_future()
+            # Исключение помечаем полученным, даже если вызывающий уже отменён
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            self._pending[key] = future, time.monotonic()
+            if len(self._pending) == 1:
+                self._load_many = load_many
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+            elif len(self._pending) >= self.max_size:
+                metrics.incr(f"{self.name}.full")
+                self._flush()
+        else:
+            future = pending[0]
+        # Отмена одного вызывающего не должна отменять результат для остальных
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        now = time.monotonic()
+        metrics.incr(f"{self.name}.batches")
+        metrics.incr(f"{self.name}.keys", len(pending))
+        # Суммарная задержка, добавленная ожиданием пакета, мс
+        metrics.incr(
+            f"{self.name}.wait_ms",
+            sum(now - enqueued for _, enqueued in pending.values()) * 1000,
+        )
+        run_in_background(self._run(
+            {key: future for key, (future, _) in pending.items()},
+            self._load_many,
+        ))
+
+    async def _run(
+        self,
+        futures: dict[str, asyncio.Future],
+        load_many: Callable[[list[str]], Awaitable[dict[str, Any]]],
+    ) -> None:
+        try:
+            values = await load_many(list(futures))
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in futures.items():
+            if not future.done():
+                future.set_result(values.get(key))
@@ -0,0 +1,20 @@
+class ConcurrencyBudget:
+    """
+    Ограничение числа одновременных фоновых задач без очереди: слот
+    занимается синхронно в момент запуска задачи, а если свободных слотов
+    нет, задача не запускается. В отличие от семафора, задачи, запущенные
+    в одном тике цикла событий, не проходят проверку все разом
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= self.limit:
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
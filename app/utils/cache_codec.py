@@ -0,0 +1,34 @@
+"""
+Формат страниц списков в кеше.
+
+Версия 1 (устаревшая): JSON-массив строк, каждая строка - JSON одной сущности.
+Версия 2: JSON-массив объектов, декодируется одним вызовом orjson.loads.
+Версия 2 со сжатием: префикс COMPRESSED_V2 и zlib от JSON версии 2.
+
+Декодер понимает все версии, поэтому записи старого формата
+дочитываются до истечения их TTL.
+"""
+import zlib
+
+import orjson
+from pydantic import BaseModel
+
+# JSON не может начинаться с нулевого байта, поэтому префикс однозначен
+COMPRESSED_V2 = b"\x00\x02"
+
+
+def encode_page(entities: list[BaseModel], compress_threshold: int = 0) -> bytes:
+    data = orjson.dumps([entity.dict() for entity in entities])
+    if 0 < compress_threshold < len(data):
+        return COMPRESSED_V2 + zlib.compress(data, 1)
+    return data
+
+
+def decode_page(data: bytes) -> list[dict]:
+    if data.startswith(COMPRESSED_V2):
+        data = zlib.decompress(data[len(COMPRESSED_V2):])
+    items = orjson.loads(data)
+    if items and isinstance(items[0], str):
+        # Версия 1
+        return [orjson.loads(item) for item in items]
+    return items
@@ -0,0 +1,39 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+import orjson
+
+# Заголовок ответа с курсором следующей страницы
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    """
+    Курсор повреждён или point-in-time, к которому он привязан, уже истёк
+    """
+
+
+def encode_cursor(search_after: list, pit_id: str | None = None) -> str:
+    """
+    Упаковать значения сортировки последней записи (и id point-in-time)
+    в непрозрачный для клиента токен
+    """
+    state = {"after": search_after}
+    if pit_id:
+        state["pit"] = pit_id
+    return urlsafe_b64encode(orjson.dumps(state)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """
+    Распаковать токен курсора. Пустой курсор - первая страница
+    """
+    if not cursor:
+        return {}
+    try:
+        state = orjson.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error) as e:
+        raise InvalidCursor("invalid cursor") from e
+    if not isinstance(state, dict) or not isinstance(state.get("after"), list):
+        raise InvalidCursor("invalid cursor")
+    return state
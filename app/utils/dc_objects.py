@@ -1,8 +1,26 @@
 from fastapi import Query
 from dataclasses import dataclass
+from pydantic import BaseModel, Field
+from uuid import UUID
+
+# Максимальное число id в одном пакетном запросе
+BATCH_MAX_SIZE = 100
 
 
 @dataclass
 class PaginatedParams:
     page_size: int = Query(10, ge=1, description='Pagination page size')
     page_number: int = Query(1, ge=1, description='Pagination page number')
+    cursor: str | None = Query(
+        None,
+        description='Cursor pagination: pass an empty value for the first page, '
+                    'then the X-Next-Cursor header of the previous response. '
+                    'page_number is ignored in this mode',
+    )
+
+
+class BatchParams(BaseModel):
+    """
+    Тело пакетного запроса записей по списку id
+    """
+    ids: list[UUID] = Field(..., min_items=1, max_items=BATCH_MAX_SIZE)
@@ -0,0 +1,51 @@
+import time
+
+from redis.asyncio import Redis
+
+from app.core.metrics import metrics
+
+# Префикс счётчиков поколений в Redis
+GENERATION_PREFIX = "cache:generation:"
+
+
+class Generations:
+    """
+    Номера поколений пространств имён кеша (по одному на индекс).
+    Номер входит в ключи кеша, поэтому его увеличение разом делает
+    недоступными все старые ключи пространства без их перебора,
+    а сами старые ключи доживают свой TTL.
+    Номер хранится в Redis и кешируется в памяти процесса на ttl секунд.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._data: dict[str, tuple[float, int]] = {}
+
+    def get(self, namespace: str) -> int:
+        """
+        Последний известный процессу номер поколения (0 - ещё не увеличивался)
+        """
+        item = self._data.get(namespace)
+        return item[1] if item else 0
+
+    async def refresh(self, redis: Redis, namespace: str) -> int:
+        """
+        Перечитать номер из Redis, если локальная копия устарела
+        """
+        item = self._data.get(namespace)
+        if item is not None and item[0] > time.monotonic():
+            return item[1]
+
+        metrics.incr("cache.generation.refreshes")
+        generation = int(await redis.get(f"{GENERATION_PREFIX}{namespace}") or 0)
+        self._data[namespace] = (time.monotonic() + self.ttl, generation)
+        return generation
+
+    async def bump(self, redis: Redis, namespace: str) -> int:
+        """
+        Увеличить номер поколения. Другие процессы увидят его
+        не позже чем через ttl секунд
+        """
+        generation = await redis.incr(f"{GENERATION_PREFIX}{namespace}")
+        self._data[namespace] = (time.monotonic() + self.ttl, generation)
+        return generation
@@ -0,0 +1,50 @@
+import time
+from collections import OrderedDict
+from typing import Any
+
+
+class LocalCache:
+    """
+    Кеш в памяти процесса, ограниченный по размеру (вытеснение LRU),
+    с временем жизни записей
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return default
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        # Запись не должна жить в памяти дольше, чем в Redis
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self, prefix: str | None = None) -> None:
+        if prefix is None:
+            self._data.clear()
+            return
+        for key in [key for key in self._data if key.startswith(prefix)]:
+            del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
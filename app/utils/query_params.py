@@ -0,0 +1,33 @@
+"""
+Приведение параметров запросов к каноническому виду. Сервисы нормализуют
+параметры до того, как строят по ним ключ кеша и запрос в Elasticsearch,
+поэтому разные написания одного запроса попадают в один ключ кеша.
+"""
+
+
+def normalize_text(text: str | None) -> str | None:
+    """
+    Схлопнуть пробельные символы. Пустая строка считается отсутствием значения
+    """
+    if text is None:
+        return None
+    return " ".join(text.split()) or None
+
+
+def normalize_query(query: str) -> str:
+    """
+    Поисковая строка: регистр и пробелы не влияют на результат,
+    потому что поля поиска проходят через стандартный анализатор
+    """
+    return " ".join(query.split()).casefold()
+
+
+def normalize_sort(sort: str | None) -> str | None:
+    """
+    Поле сортировки с необязательным знаком: «+field» и «field» - одно
+    и то же (в строке запроса «+» приходит как пробел), «-field» - по убыванию
+    """
+    sort = normalize_text(sort)
+    if sort is None:
+        return None
+    return sort.lstrip("+").strip() or None
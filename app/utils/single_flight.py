@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+from app.core.metrics import metrics
+
+
+class SingleFlight:
+    """
+    Объединение одновременных одинаковых вызовов: пока вызов по ключу
+    выполняется, остальные вызывающие ждут его результат, а не делают свой
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            # Вызов выполняется отдельной задачей, чтобы отмена первого
+            # запроса (например, клиент закрыл соединение) не отменяла его для остальных
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            metrics.incr(f"{self.name}.collapsed")
+        return await asyncio.shield(task)
+
+    def is_running(self, key: str) -> bool:
+        return key in self._calls
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Помечаем исключение полученным, даже если все ожидающие уже отменены
+        if not task.cancelled():
+            task.exception()
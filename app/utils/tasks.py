@@ -0,0 +1,22 @@
+import asyncio
+import logging
+from typing import Coroutine
+
+# Ссылки на фоновые задачи, чтобы сборщик мусора не удалил их до завершения
+_background_tasks: set[asyncio.Task] = set()
+
+
+def run_in_background(coro: Coroutine) -> asyncio.Task:
+    """
+    Запустить корутину в фоне, не дожидаясь её результата
+    """
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logging.error(f"Background task failed: {task.exception()}")
@@ -0,0 +1,73 @@
+"""
+Размер страницы списка в кеше и стоимость её чтения: формат версии 1
+(JSON-строки внутри JSON-массива), версии 2 (плоский массив) и версии 2
+со сжатием. Время разделено на разбор JSON (то, что меняет формат)
+и сборку моделей так, как её делает сервис (construct_trusted).
+Сборка моделей заметно дороже разбора, поэтому выигрыш версии 2
+во времени полного чтения мал; её смысл - размер страницы
+и возможность сжатия.
+
+Запуск из корня проекта:
+    python -m benchmarks.cache_codec --page-size 50
+"""
+import argparse
+import timeit
+import uuid
+
+import orjson
+
+from app.models.base_model import BaseFilm, construct_trusted
+from app.models.film import Film, Films
+from app.utils.cache_codec import decode_page, encode_page
+
+
+def make_page(model: type[BaseFilm], page_size: int) -> list[BaseFilm]:
+    entities = []
+    for number in range(page_size):
+        data = {"id": str(uuid.uuid4()), "title": f"Film {number}", "imdb_rating": 7.5}
+        if model is Film:
+            data.update({
+                "description": "Lorem ipsum " * 20,
+                "actors_names": ["Ann", "Bob"],
+                "writers_names": ["Ben", "Howard"],
+                "actors": [{"id": str(uuid.uuid4()), "name": "Ann"}] * 5,
+                "writers": [{"id": str(uuid.uuid4()), "name": "Ben"}] * 2,
+            })
+        entities.append(model(**data))
+    return entities
+
+
+def parse_v1(data: bytes) -> list[dict]:
+    return [orjson.loads(entity) for entity in orjson.loads(data)]
+
+
+def read_page(data: bytes, parse, model: type[BaseFilm]) -> list[BaseFilm]:
+    return [construct_trusted(model, item) for item in parse(data)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--compress-threshold", type=int, default=1024)
+    args = parser.parse_args()
+
+    for model in (Films, Film):
+        page = make_page(model, args.page_size)
+        payloads = {
+            "v1": (orjson.dumps([entity.json() for entity in page]), parse_v1),
+            "v2": (encode_page(page), decode_page),
+            "v2+zlib": (encode_page(page, args.compress_threshold), decode_page),
+        }
+        print(f"{model.__name__}, {args.page_size} entities per page")
+        print(f"  {'format':8} {'bytes':>7}  {'parse, us':>10}  {'parse+models, us':>17}")
+        for name, (data, parse) in payloads.items():
+            parse_seconds = timeit.timeit(lambda: parse(data), number=args.number)
+            read_seconds = timeit.timeit(lambda: read_page(data, parse, model), number=args.number)
+            print(
+                f"  {name:8} {len(data):7}  {parse_seconds / args.number * 1e6:10.1f}"
+                f"  {read_seconds / args.number * 1e6:17.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Доля попаданий в кеш списков и поиска на записанном трафике: ключи
+из параметров как есть (как строились до нормализации) и ключи
+из нормализованных параметров (app.utils.query_params).
+Кеш считается неограниченным и без TTL, поэтому доли - верхняя оценка;
+важна разница между столбцами.
+
+На вход - access-лог uvicorn или файл с URL запросов, по одному в строке.
+Запросы по курсору не кешируются и пропускаются. С --genres-from-elastic
+справочник жанров загружается из Elasticsearch (адрес из настроек),
+иначе жанры сравниваются только с точностью до пробелов.
+
+Запуск из корня проекта:
+    python -m benchmarks.cache_key_hit_ratio access.log --genres-from-elastic
+"""
+import argparse
+import asyncio
+import re
+from collections import Counter
+from urllib.parse import parse_qs, urlsplit
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+
+from app.core.config import settings
+from app.services.film import normalize_films_params
+from app.services.genres import genres_dictionary
+from app.utils.query_params import normalize_query
+
+REQUEST_PATH = re.compile(r"(/api/v1/\S+)")
+PERSON_FILMS_PATH = re.compile(r"/api/v1/persons/([^/]+)/film/?")
+SEARCH_SHAPES = {"/api/v1/films/search": "films_search", "/api/v1/persons": "persons_search"}
+
+
+def request_params(url: str) -> tuple[str, dict, dict] | None:
+    """
+    Тип запроса, параметры ключа как есть и нормализованные
+    (None - запрос не попадает в кеш списков)
+    """
+    parts = urlsplit(url)
+    query = {name: values[-1] for name, values in parse_qs(parts.query, keep_blank_values=True).items()}
+    if "cursor" in query:
+        return None
+    try:
+        page = {
+            "page_size": int(query.get("page_size", 10)),
+            "page_number": int(query.get("page_number", 1)),
+        }
+    except ValueError:
+        return None
+
+    path = parts.path.rstrip("/")
+    if path == "/api/v1/films":
+        genre, sort = query.get("genre"), query.get("sort", "-imdb_rating")
+        normalized_genre, normalized_sort = normalize_films_params(genre, sort)
+        return (
+            "films",
+            {"genre": genre, "sort": sort, **page},
+            {"genre": normalized_genre, "sort": normalized_sort, **page},
+        )
+    if path in SEARCH_SHAPES:
+        if path == "/api/v1/films/search" and "query" not in query:
+            return None
+        text = query.get("query", "")
+        return (
+            SEARCH_SHAPES[path],
+            {"query": text, **page},
+            {"query": normalize_query(text), **page},
+        )
+    if path == "/api/v1/genres":
+        return "genres", page, page
+    match = PERSON_FILMS_PATH.fullmatch(parts.path)
+    if match:
+        params = {"person_id": match.group(1).lower(), **page}
+        return "person_films", params, params
+    return None
+
+
+def replay(lines) -> dict[str, Counter]:
+    stats: dict[str, Counter] = {}
+    seen_raw, seen_normalized = set(), set()
+    for line in lines:
+        match = REQUEST_PATH.search(line)
+        if not match:
+            continue
+        request = request_params(match.group(1))
+        if request is None:
+            continue
+        shape, raw, normalized = request
+        raw_key = orjson.dumps([shape, raw])
+        normalized_key = orjson.dumps([shape, normalized])
+        counter = stats.setdefault(shape, Counter())
+        counter["requests"] += 1
+        counter["raw_hits"] += raw_key in seen_raw
+        counter["normalized_hits"] += normalized_key in seen_normalized
+        seen_raw.add(raw_key)
+        seen_normalized.add(normalized_key)
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("log", type=argparse.FileType())
+    parser.add_argument("--genres-from-elastic", action="store_true")
+    args = parser.parse_args()
+
+    if args.genres_from_elastic:
+        es = AsyncElasticsearch(hosts=[f"http://{settings.elastic_host}:{settings.elastic_port}"])
+        try:
+            await genres_dictionary.refresh(es)
+        finally:
+            await es.close()
+
+    stats = replay(args.log)
+    total = sum(stats.values(), Counter())
+    print(f"{'shape':14} {'requests':>9} {'raw':>7} {'normalized':>11}")
+    for shape, counter in [*sorted(stats.items()), ("total", total)]:
+        requests = counter["requests"] or 1
+        print(
+            f"{shape:14} {counter['requests']:9} "
+            f"{counter['raw_hits'] / requests:7.1%} {counter['normalized_hits'] / requests:11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,143 @@
+"""
+Задержка запросов списка фильмов по жанру и фильмов персоны:
+прежние запросы (match в bool.must / bool.should с подсчётом релевантности)
+на индексе с динамическим маппингом и запросы в контексте фильтра
+по keyword-полям с request_cache на индексе с маппингом из app.db.indices.
+Нужен локальный Elasticsearch (адрес берётся из настроек приложения);
+оба индекса засеваются одними и теми же случайными фильмами
+и удаляются после замера.
+
+Запуск из корня проекта:
+    python -m benchmarks.es_filter_context --films 200000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import uuid
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_bulk
+
+from app.core.config import settings
+from app.db.indices import MOVIES
+from app.services.film import FILMS_SOURCE_FIELDS, GENRE_FILTER_FIELD
+from app.services.person import PERSON_ROLES
+
+# Индекс для прежних запросов (динамический маппинг, как от ETL) и для новых
+DYNAMIC_INDEX = "benchmark_movies_dynamic"
+MANAGED_INDEX = "benchmark_movies"
+GENRES = ["Action", "Adventure", "Comedy", "Drama", "Fantasy", "Horror", "Sci-Fi", "Thriller"]
+
+
+def make_film(persons: list[dict]) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Film {random.randint(0, 10 ** 6)}",
+        "imdb_rating": round(random.uniform(0, 10), 1),
+        "description": "Lorem ipsum dolor sit amet " * 10,
+        "genre": random.sample(GENRES, 2),
+        "director": random.choice(persons),
+        "actors": random.sample(persons, 5),
+        "writers": random.sample(persons, 2),
+    }
+
+
+async def seed(es: AsyncElasticsearch, films: int, persons: list[dict]) -> None:
+    await es.indices.delete(index=[DYNAMIC_INDEX, MANAGED_INDEX], ignore_unavailable=True)
+    await es.indices.create(index=DYNAMIC_INDEX)
+    await es.indices.create(index=MANAGED_INDEX, **MOVIES)
+    documents = [make_film(persons) for _ in range(films)]
+    for index in (DYNAMIC_INDEX, MANAGED_INDEX):
+        actions = ({"_index": index, "_source": document} for document in documents)
+        await async_bulk(es, actions, chunk_size=5000, refresh="wait_for")
+
+
+def genre_queries(genre: str) -> dict[str, tuple[str, dict, dict]]:
+    sort = [{"imdb_rating": {"order": "desc"}}]
+    return {
+        "match": (
+            DYNAMIC_INDEX,
+            {"query": {"bool": {"must": [{"match": {"genre": genre}}]}}, "sort": sort},
+            {},
+        ),
+        "filter": (
+            MANAGED_INDEX,
+            {
+                "query": {"bool": {"filter": [{"term": {GENRE_FILTER_FIELD: genre}}]}},
+                "sort": sort,
+                "_source": FILMS_SOURCE_FIELDS,
+            },
+            {"request_cache": True},
+        ),
+    }
+
+
+def person_queries(person_id: str) -> dict[str, tuple[str, dict, dict]]:
+    return {
+        "match": (
+            DYNAMIC_INDEX,
+            {"query": {"bool": {"should": [
+                {"match": {f"{role}.id": person_id}} for role in PERSON_ROLES
+            ]}}},
+            {},
+        ),
+        "filter": (
+            MANAGED_INDEX,
+            {
+                "query": {"bool": {"filter": [{"bool": {
+                    "should": [{"term": {f"{role}.id": person_id}} for role in PERSON_ROLES],
+                    "minimum_should_match": 1,
+                }}]}},
+                "_source": FILMS_SOURCE_FIELDS,
+            },
+            {"request_cache": True},
+        ),
+    }
+
+
+async def measure(
+        es: AsyncElasticsearch,
+        index: str,
+        body: dict,
+        params: dict,
+        requests: int,
+) -> list[float]:
+    latencies = []
+    for page_number in range(requests):
+        # Несколько первых страниц, как у реальных клиентов
+        request = {**body, "from": page_number % 5 * 10, "size": 10}
+        started = time.perf_counter()
+        await es.search(index=index, body=request, **params)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--films", type=int, default=200_000)
+    parser.add_argument("--persons", type=int, default=5_000)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    es = AsyncElasticsearch(hosts=[f"http://{settings.elastic_host}:{settings.elastic_port}"])
+    persons = [{"id": str(uuid.uuid4()), "name": f"Person {number}"} for number in range(args.persons)]
+    try:
+        await seed(es, args.films, persons)
+        shapes = {
+            "genre": genre_queries(random.choice(GENRES)),
+            "person": person_queries(random.choice(persons)["id"]),
+        }
+        for shape, queries in shapes.items():
+            for name, (index, body, params) in queries.items():
+                latencies = await measure(es, index, body, params, args.requests)
+                p95 = statistics.quantiles(latencies, n=20)[-1]
+                print(f"{shape:7} {name:7} p50 {statistics.median(latencies):7.2f} ms  p95 {p95:7.2f} ms")
+    finally:
+        await es.indices.delete(index=[DYNAMIC_INDEX, MANAGED_INDEX], ignore_unavailable=True)
+        await es.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,62 @@
+"""
+Пропускная способность чтения и записи кеша при большом числе одновременных
+запросов: обычный клиент Redis и AutoPipelineRedis.
+Нужен запущенный Redis (адрес берётся из настроек приложения).
+
+Запуск из корня проекта:
+    python -m benchmarks.redis_autopipeline --concurrency 200
+"""
+import argparse
+import asyncio
+import time
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.auto_pipeline import AutoPipelineRedis
+
+KEY_PREFIX = "benchmark:autopipeline"
+
+
+async def worker(redis: Redis | AutoPipelineRedis, number: int, operations: int) -> None:
+    # Как сервисы: чтение из кеша, при промахе - запись
+    for operation in range(operations):
+        key = f"{KEY_PREFIX}:{(number * operations + operation) % 1000}"
+        if await redis.get(key) is None:
+            await redis.set(key, b"x" * 512, 60)
+
+
+async def measure(redis: Redis | AutoPipelineRedis, concurrency: int, operations: int) -> float:
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(redis, number, operations) for number in range(concurrency)))
+    return concurrency * operations / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--operations", type=int, default=200)
+    args = parser.parse_args()
+
+    redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    clients = {"plain": redis, "autopipeline": AutoPipelineRedis(redis)}
+    try:
+        for name, client in clients.items():
+            # Прогрев соединений и ключей
+            await measure(client, args.concurrency, 10)
+            ops = await measure(client, args.concurrency, args.operations)
+            print(f"{name:12} {ops:10.0f} ops/s")
+
+        counters = metrics.snapshot()
+        flushes = counters.get("redis.autopipeline.flushes", 0)
+        if flushes:
+            commands = counters["redis.autopipeline.commands"]
+            print(f"autopipeline: {commands / flushes:.1f} commands per flush")
+    finally:
+        await redis.delete(*[f"{KEY_PREFIX}:{number}" for number in range(1000)])
+        await redis.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+"""
+Процессорное время на один запрос при попадании в кеш для /api/v1/films/{film_id}
+и /api/v1/films/: путь с повторной валидацией (parse_raw, модели ответа,
+проверка по response_model в FastAPI) и путь с доверенной сборкой моделей
+и готовым телом ответа.
+
+Запуск из корня проекта:
+    python -m benchmarks.response_build
+"""
+import argparse
+import time
+import uuid
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from fastapi.utils import create_response_field
+
+from app.api.v1.films import (
+    ActorResponse, DirectorResponse, FilmListResponse, FilmResponse, GenreResponse,
+    WriterResponse, film_list_response_body, film_response_body,
+)
+from app.models.base_model import construct_trusted
+from app.models.film import Film, Films
+from app.utils.cache_codec import decode_page, encode_page
+
+
+def make_film() -> Film:
+    return Film(
+        id=str(uuid.uuid4()),
+        title="The Star",
+        imdb_rating=8.5,
+        description="New World " * 20,
+        genre=[{"uuid": uuid.uuid4(), "name": name} for name in ("Action", "Sci-Fi")],
+        director=[{"uuid": uuid.uuid4(), "full_name": "Ann"}],
+        actors_names=["Ann", "Bob"],
+        writers_names=["Ben", "Howard"],
+        actors=[{"id": str(uuid.uuid4()), "name": f"Actor {n}"} for n in range(10)],
+        writers=[{"id": str(uuid.uuid4()), "name": f"Writer {n}"} for n in range(3)],
+    )
+
+
+def validate_and_render(field, content) -> bytes:
+    # То же, что делает FastAPI для response_model: валидация и jsonable_encoder
+    value, errors = field.validate(content, {}, loc=("response",))
+    assert not errors
+    return ORJSONResponse(jsonable_encoder(value)).body
+
+
+def detail_before(data: bytes, field) -> bytes:
+    film = Film.parse_raw(data)
+    response = FilmResponse(
+        uuid=film.id,
+        title=film.title,
+        description=film.description,
+        imdb_rating=film.imdb_rating,
+        genre=[GenreResponse(name=genre.name, uuid=genre.uuid) for genre in film.genre],
+        directors=[
+            DirectorResponse(uuid=director.uuid, full_name=director.full_name)
+            for director in film.director
+        ],
+        actors=[ActorResponse(uuid=actor.id, full_name=actor.name) for actor in film.actors],
+        writers=[WriterResponse(uuid=writer.id, full_name=writer.name) for writer in film.writers],
+    )
+    return validate_and_render(field, response)
+
+
+def detail_after(data: bytes) -> bytes:
+    film = construct_trusted(Film, orjson.loads(data))
+    return ORJSONResponse(film_response_body(film)).body
+
+
+def list_before(data: bytes, field) -> bytes:
+    films = [Films(**item) for item in decode_page(data)]
+    response = [
+        FilmListResponse(uuid=film.id, title=film.title, imdb_rating=film.imdb_rating)
+        for film in films
+    ]
+    return validate_and_render(field, response)
+
+
+def list_after(data: bytes) -> bytes:
+    films = [construct_trusted(Films, item) for item in decode_page(data)]
+    return ORJSONResponse(film_list_response_body(films)).body
+
+
+def cpu_time(func, number: int) -> float:
+    started = time.process_time()
+    for _ in range(number):
+        func()
+    return (time.process_time() - started) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    detail = make_film().json().encode()
+    page = encode_page([
+        Films(id=uuid.uuid4(), title=f"Film {n}", imdb_rating=7.5) for n in range(args.page_size)
+    ])
+    detail_field = create_response_field(name="response", type_=FilmResponse)
+    list_field = create_response_field(name="response", type_=list[FilmListResponse])
+
+    assert orjson.loads(detail_before(detail, detail_field)) == orjson.loads(detail_after(detail))
+    assert orjson.loads(list_before(page, list_field)) == orjson.loads(list_after(page))
+
+    print(f"detail          before {cpu_time(lambda: detail_before(detail, detail_field), args.number):8.1f} us"
+          f"  after {cpu_time(lambda: detail_after(detail), args.number):8.1f} us")
+    print(f"list ({args.page_size:3} films) before {cpu_time(lambda: list_before(page, list_field), args.number):8.1f} us"
+          f"  after {cpu_time(lambda: list_after(page), args.number):8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
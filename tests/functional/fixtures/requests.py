@@ -9,6 +9,7 @@ from copy import deepcopy
 
 from redis.asyncio.client import Redis
 
+from app.db.indices import INDICES
 from tests.functional.settings import test_settings
 from tests.functional.testdata.data import TEST_DATA, TEST_DATA_GENRE, TEST_DATA_PERSON
 from tests.functional.utils.dc_objects import Response
@@ -22,7 +23,8 @@ def es_write_data(es_client: AsyncElasticsearch, redis_client: Redis, request):
         if await es_client.indices.exists(index=index):
             await es_client.indices.delete(index=index)
 
-        await es_client.indices.create(index=index)
+        # Индекс создаётся с тем же маппингом, что и в рабочем окружении
+        await es_client.indices.create(index=index, **INDICES[index])
 
         # refresh="wait_for" - опция для ожидания обновления индекса после выполнения async_bulk
         updated, errors = await async_bulk(client=es_client, actions=data, refresh="wait_for")
@@ -51,6 +53,21 @@ def make_get_request(session_client):
     return inner
 
 
+@pytest_asyncio.fixture(name='make_concurrent_get_requests')
+def make_concurrent_get_requests(session_client):
+    async def inner(urls: list[str]) -> list[Response]:
+        async def get(url: str) -> Response:
+            async with session_client.get(url) as response:
+                # Ответ на внутреннюю ошибку сервиса - не JSON
+                body = await response.json() if response.content_type == 'application/json' else None
+                return Response(body, response.headers, response.status)
+
+        # Все запросы отправляются одновременно
+        return await asyncio.gather(*(get(url) for url in urls))
+
+    return inner
+
+
 @pytest_asyncio.fixture()
 def es_data(request) -> list[dict]:
     es_data = []
@@ -110,6 +127,31 @@ def es_data(request) -> list[dict]:
             copy_film_data['title'] = 'The Star'
             es_data.append(deepcopy(copy_film_data))
 
+    if type_test == 'leaderboard':
+        # Разные рейтинги: порядок страниц однозначен и в Elasticsearch, и в Redis
+        for i in range(12):
+            copy_film_data['id'] = str(uuid.uuid4())
+            copy_film_data['title'] = f'Leaderboard film {i}'
+            copy_film_data['imdb_rating'] = 1 + i * 0.5
+            copy_film_data['genre'] = ['Action'] if i % 2 else ['Comedy']
+            es_data.append(deepcopy(copy_film_data))
+
+    if type_test == 'filmography':
+        # Рейтинги повторяются по три: порядок внутри группы задаёт id.
+        # В каждом третьем фильме персона - только сценарист
+        for i in range(12):
+            copy_film_data['id'] = str(uuid.uuid4())
+            copy_film_data['title'] = f'Filmography film {i}'
+            copy_film_data['imdb_rating'] = float(10 - i // 3)
+            if i % 3 == 0:
+                film = deepcopy(copy_film_data)
+                film['director'] = TEST_DATA['actors'][1]
+                film['actors'] = [TEST_DATA['actors'][1]]
+                film['writers'] = [TEST_DATA['actors'][0]]
+                es_data.append(film)
+            else:
+                es_data.append(deepcopy(copy_film_data))
+
     if type_test == 'redis_films_id':
         copy_films_data = deepcopy(TEST_DATA)
         es_data.append(deepcopy(copy_films_data))
@@ -7,7 +7,8 @@ class TestSettings(BaseSettings):
         'movies':
             [
                 'redis_search', 'redis_films', 'limit', 'validation', 'phrase',
-                'film', 'all_films', 'films_validation', 'redis_films_id'
+                'film', 'all_films', 'films_validation', 'redis_films_id', 'leaderboard',
+                'filmography'
             ],
         'genres': ['limit_genre', 'genre_validation', 'redis_genre', 'genre'],
         'persons': ['limit_person', 'person', 'person_validation', 'person_films', 'redis_person']
@@ -17,6 +18,8 @@ class TestSettings(BaseSettings):
     redis_host: str = 'localhost'
     redis_port: int = 6379
     service_url: str = 'http://127.0.0.1:8000'
+    # Сервис с включённым кешем ответов: остальные тесты проверяют кеш сервисов
+    response_cache_service_url: str = 'http://127.0.0.1:8002'
 
     class Config:
         env_file = '.env.test'
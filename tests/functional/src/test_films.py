@@ -1,6 +1,9 @@
 import asyncio
+from http import HTTPStatus
 
 import pytest
+from app.services.leaderboard import brief_key, leaderboard_key, rating_score, set_brief
+from tests.functional.settings import test_settings
 from tests.functional.testdata.data import PARAMETERS
 from hashlib import md5
 
@@ -171,3 +174,265 @@ async def test_film_id_with_redis_cache(
     assert response_cached.status == response.status
     assert response_cached.body == response.body
 
+
+@pytest.mark.parametrize(
+    'query_data, expected_answer',
+    PARAMETERS['redis_films_id']
+)
+@pytest.mark.fixt_data('redis_films_id')
+@pytest.mark.asyncio
+async def test_film_id_etag(
+        es_write_data,
+        session_client,
+        es_data: list[dict],
+        query_data,
+        expected_answer
+) -> None:
+    """
+    Тест кеша ответов: повторный запрос с If-None-Match получает 304 без тела.
+    Запросы идут в отдельный экземпляр сервиса с включённым кешем ответов
+    """
+    await es_write_data(es_data, 'movies')
+    url = f'{test_settings.response_cache_service_url}/api/v1/films/{query_data["id"]}'
+
+    async with session_client.get(url) as response:
+        assert response.status == expected_answer['status']
+        etag = response.headers.get('ETag')
+    assert etag, 'Ответ должен содержать ETag'
+
+    async with session_client.get(url, headers={'If-None-Match': etag}) as response:
+        assert response.status == HTTPStatus.NOT_MODIFIED
+        assert response.headers.get('ETag') == etag
+        assert await response.read() == b''
+
+
+@pytest.mark.parametrize(
+    'query_data, expected_answer',
+    PARAMETERS['redis_films_id']
+)
+@pytest.mark.fixt_data('redis_films_id')
+@pytest.mark.asyncio
+async def test_films_batch(
+        es_write_data,
+        session_client,
+        es_data: list[dict],
+        query_data,
+        expected_answer
+) -> None:
+    """
+    Тест пакетного запроса: порядок ответа совпадает с порядком ids,
+    для отсутствующих фильмов возвращается null
+    """
+    await es_write_data(es_data, 'movies')
+    url = f'{test_settings.service_url}/api/v1/films/batch'
+    missing_id = '00000000-0000-0000-0000-000000000000'
+
+    async with session_client.post(
+            url, json={'ids': [missing_id, query_data['id']]}
+    ) as response:
+        assert response.status == expected_answer['status']
+        body = await response.json()
+
+    assert body[0] is None
+    assert body[1]['uuid'] == expected_answer['id']
+    assert body[1]['title'] == expected_answer['title']
+
+
+@pytest.mark.parametrize(
+    'query_data, expected_answer',
+    PARAMETERS['redis_films_id']
+)
+@pytest.mark.fixt_data('redis_films_id')
+@pytest.mark.asyncio
+async def test_film_id_fields(
+        es_write_data,
+        session_client,
+        es_data: list[dict],
+        query_data,
+        expected_answer
+) -> None:
+    """
+    Тест ?fields=: в ответе только запрошенные поля
+    """
+    await es_write_data(es_data, 'movies')
+    url = f'{test_settings.service_url}/api/v1/films/{query_data["id"]}'
+
+    async with session_client.get(url, params={'fields': 'uuid,title'}) as response:
+        assert response.status == expected_answer['status']
+        body = await response.json()
+    assert body == {'uuid': expected_answer['id'], 'title': expected_answer['title']}
+
+    async with session_client.get(url, params={'fields': 'title,unknown'}) as response:
+        assert response.status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize(
+    'query_data, expected_answer',
+    PARAMETERS['redis_films_id']
+)
+@pytest.mark.fixt_data('redis_films_id')
+@pytest.mark.asyncio
+async def test_film_id_concurrent_misses(
+        es_write_data,
+        es_client,
+        redis_client,
+        make_concurrent_get_requests,
+        es_data: list[dict],
+        query_data,
+        expected_answer
+) -> None:
+    """
+    Тест одновременных промахов по одному фильму: все запросы получают
+    один и тот же ответ, а ошибка Elasticsearch достаётся всем ожидающим
+    и не попадает в кеш
+    """
+    await es_write_data(es_data, 'movies')
+    url = f'{test_settings.service_url}/api/v1/films/{query_data["id"]}'
+
+    # Индекс закрыт: запрос документа завершается ошибкой Elasticsearch
+    await es_client.indices.close(index='movies')
+    try:
+        responses = await make_concurrent_get_requests([url] * 20)
+    finally:
+        await es_client.indices.open(index='movies', wait_for_active_shards='all')
+    assert all(response.status == HTTPStatus.INTERNAL_SERVER_ERROR for response in responses)
+    assert await redis_client.get(f'movies:{query_data["id"]}') is None
+
+    responses = await make_concurrent_get_requests([url] * 20)
+    assert all(response.status == expected_answer['status'] for response in responses)
+    assert all(response.body == responses[0].body for response in responses)
+    assert responses[0].body['uuid'] == expected_answer['id']
+    assert await redis_client.get(f'movies:{query_data["id"]}') is not None
+
+
+@pytest.mark.fixt_data('limit')
+@pytest.mark.asyncio
+async def test_films_concurrent_distinct_misses(
+        es_write_data,
+        es_client,
+        make_concurrent_get_requests,
+        es_data: list[dict]
+) -> None:
+    """
+    Тест одновременных промахов по разным фильмам: каждый запрос получает
+    свой фильм, а ошибка общей загрузки достаётся всем запросам
+    """
+    await es_write_data(es_data, 'movies')
+    film_ids = [row['_id'] for row in es_data]
+    urls = [f'{test_settings.service_url}/api/v1/films/{film_id}' for film_id in film_ids]
+
+    await es_client.indices.close(index='movies')
+    try:
+        responses = await make_concurrent_get_requests(urls)
+    finally:
+        await es_client.indices.open(index='movies', wait_for_active_shards='all')
+    assert all(response.status == HTTPStatus.INTERNAL_SERVER_ERROR for response in responses)
+
+    responses = await make_concurrent_get_requests(urls)
+    assert all(response.status == HTTPStatus.OK for response in responses)
+    assert [response.body['uuid'] for response in responses] == film_ids
+
+
+@pytest.mark.fixt_data('limit')
+@pytest.mark.asyncio
+async def test_films_concurrent_redis_error(
+        es_write_data,
+        redis_client,
+        session_client,
+        make_concurrent_get_requests,
+        es_data: list[dict]
+) -> None:
+    """
+    Тест одновременных запросов к кешу: команды Redis объединяются в конвейеры,
+    ответы не перепутаны между запросами, а ошибка одной команды Redis
+    не влияет на остальные команды того же конвейера
+    """
+    await es_write_data(es_data, 'movies')
+    film_ids = [row['_id'] for row in es_data]
+    urls = [f'{test_settings.service_url}/api/v1/films/{film_id}' for film_id in film_ids]
+
+    async def autopipeline_counters() -> tuple[float, float]:
+        async with session_client.get(f'{test_settings.service_url}/api/metrics/') as response:
+            counters = await response.json()
+        return counters.get('redis.autopipeline.commands', 0), counters.get('redis.autopipeline.flushes', 0)
+
+    # Первый проход заполняет кеш, второй читает из него
+    commands, flushes = await autopipeline_counters()
+    for _ in range(2):
+        responses = await make_concurrent_get_requests(urls)
+        assert [response.body['uuid'] for response in responses] == film_ids
+    new_commands, new_flushes = await autopipeline_counters()
+    # Конвейер в среднем несёт больше одной команды
+    assert new_commands - commands > new_flushes - flushes > 0
+    for film_id in film_ids:
+        assert await redis_client.get(f'movies:{film_id}') is not None
+
+    # Ключ неверного типа: GET по нему завершается ошибкой WRONGTYPE
+    broken_id = film_ids[0]
+    await redis_client.delete(f'movies:{broken_id}')
+    await redis_client.lpush(f'movies:{broken_id}', 'broken')
+
+    responses = await make_concurrent_get_requests(urls)
+    assert responses[0].status == HTTPStatus.INTERNAL_SERVER_ERROR
+    assert all(response.status == HTTPStatus.OK for response in responses[1:])
+    assert [response.body['uuid'] for response in responses[1:]] == film_ids[1:]
+
+
+@pytest.mark.fixt_data('leaderboard')
+@pytest.mark.asyncio
+async def test_films_leaderboard(
+        es_write_data,
+        redis_client,
+        session_client,
+        es_data: list[dict]
+) -> None:
+    """
+    Тест списков по рейтингу из Redis: страницы из рейтинга и кратких записей
+    совпадают со страницами из Elasticsearch, в том числе при промахе
+    по краткой записи
+    """
+    await es_write_data(es_data, 'movies')
+    films = [row['_source'] for row in es_data]
+    url = f'{test_settings.service_url}/api/v1/films/'
+    queries = [
+        {'sort': '-imdb_rating', 'page_size': 5, 'page_number': page_number}
+        for page_number in (1, 2, 3)
+    ] + [{'sort': '-imdb_rating', 'genre': 'Action', 'page_size': 4, 'page_number': 1}]
+
+    async def get_pages() -> list[list[dict]]:
+        pages = []
+        for params in queries:
+            async with session_client.get(url, params=params) as response:
+                assert response.status == HTTPStatus.OK
+                pages.append(await response.json())
+        return pages
+
+    async def leaderboard_hits() -> float:
+        async with session_client.get(f'{test_settings.service_url}/api/metrics/') as response:
+            return (await response.json()).get('leaderboard.hits', 0)
+
+    # Рейтинга в Redis нет: страницы загружаются из Elasticsearch
+    es_pages = await get_pages()
+    ratings = [film['imdb_rating'] for page in es_pages[:3] for film in page]
+    assert ratings == sorted((film['imdb_rating'] for film in films), reverse=True)
+    action_ids = {film['id'] for film in films if film['genre'] == ['Action']}
+    assert len(es_pages[3]) == 4
+    assert all(film['uuid'] in action_ids for film in es_pages[3])
+
+    # Рейтинги и краткие записи, как их ведёт загрузчик данных
+    await redis_client.flushdb()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for film in films:
+            score = rating_score(film['imdb_rating'])
+            pipe.zadd(leaderboard_key(), {film['id']: score})
+            for genre in film['genre']:
+                pipe.zadd(leaderboard_key(genre), {film['id']: score})
+            set_brief(pipe, film)
+        await pipe.execute()
+    # Краткая запись одного фильма загружается из Elasticsearch
+    await redis_client.delete(brief_key(es_pages[0][0]['uuid']))
+
+    hits = await leaderboard_hits()
+    assert await get_pages() == es_pages
+    assert await leaderboard_hits() - hits >= len(queries)
+    assert await redis_client.get(brief_key(es_pages[0][0]['uuid'])) is not None
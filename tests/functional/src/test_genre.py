@@ -1,6 +1,7 @@
 import pytest
 import asyncio
 import orjson
+from tests.functional.settings import test_settings
 from tests.functional.testdata.data import PARAMETERS
 
 
@@ -30,6 +31,32 @@ async def test_genre_limit(
     assert len(response.body) == expected_answer['length']
 
 
+@pytest.mark.fixt_data('limit_genre')
+@pytest.mark.asyncio
+async def test_genre_cursor(
+        es_write_data,
+        session_client,
+        es_data: list[dict]
+) -> None:
+    """
+    Тест курсорной пагинации: обход по X-Next-Cursor возвращает
+    все жанры ровно по одному разу
+    """
+    await es_write_data(es_data, 'genres')
+    url = f'{test_settings.service_url}/api/v1/genres/'
+
+    names = []
+    cursor = ''
+    while cursor is not None:
+        params = {'page_size': 25, 'cursor': cursor}
+        async with session_client.get(url, params=params) as response:
+            assert response.status == 200
+            names += [genre['name'] for genre in await response.json()]
+            cursor = response.headers.get('X-Next-Cursor')
+
+    assert sorted(names) == sorted(genre['_source']['name'] for genre in es_data)
+
+
 @pytest.mark.parametrize(
     'query_data, expected_answer',
     PARAMETERS['search_genre']
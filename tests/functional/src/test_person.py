@@ -1,8 +1,14 @@
 import asyncio
+from http import HTTPStatus
 
 import pytest
 from orjson import orjson
 
+from app.services.filmography import (
+    BUILT_KEY, film_roles, filmography_key, filmography_score, roles_key,
+)
+from app.services.leaderboard import set_brief
+from tests.functional.settings import test_settings
 from tests.functional.testdata.data import PARAMETERS
 from tests.functional.utils.films_utils import get_es_data
 from tests.functional.testdata.data import TEST_DATA_PERSON
@@ -137,4 +143,73 @@ async def test_person_with_redis_cache(
     # Проверка, что данные из кэша совпадают с первоначальными данными
     cached_genres = orjson.loads(cached_data)
     assert cached_genres['full_name'] == expected_answer['full_name']
-    assert cached_genres['id'] == expected_answer['id']
\ No newline at end of file
+    assert cached_genres['id'] == expected_answer['id']
+
+
+@pytest.mark.fixt_data('filmography')
+@pytest.mark.asyncio
+async def test_films_by_person_filmography(
+        es_write_data,
+        redis_client,
+        session_client,
+        es_data: list[dict]
+) -> None:
+    """
+    Тест фильмов персоны из обратного индекса в Redis: страницы по номеру
+    и по курсору из Elasticsearch и страницы из индекса совпадают - порядок
+    по убыванию рейтинга и возрастанию id, роли персоны в каждом фильме
+    """
+    await es_write_data(es_data, 'movies')
+    person_id = TEST_DATA_PERSON['id']
+    films = [row['_source'] for row in es_data]
+    expected = [
+        {
+            'id': film['id'],
+            'title': film['title'],
+            'imdb_rating': film['imdb_rating'],
+            'roles': film_roles(film)[person_id],
+        }
+        for film in sorted(films, key=lambda film: (-film['imdb_rating'], film['id']))
+    ]
+    url = f'{test_settings.service_url}/api/v1/persons/{person_id}/film'
+
+    async def get_pages() -> list[dict]:
+        pages = []
+        for page_number in (1, 2, 3):
+            params = {'page_size': 5, 'page_number': page_number}
+            async with session_client.get(url, params=params) as response:
+                assert response.status == HTTPStatus.OK
+                pages.extend(await response.json())
+        return pages
+
+    async def filmography_hits() -> float:
+        async with session_client.get(f'{test_settings.service_url}/api/metrics/') as response:
+            return (await response.json()).get('filmography.hits', 0)
+
+    # Индекса в Redis нет: страницы загружаются из Elasticsearch
+    assert await get_pages() == expected
+    assert {tuple(film['roles']) for film in expected} == {('director', 'actor'), ('writer',)}
+
+    # Страницы по курсору идут в том же порядке
+    cursor_pages, cursor = [], ''
+    while cursor is not None:
+        async with session_client.get(url, params={'page_size': 5, 'cursor': cursor}) as response:
+            assert response.status == HTTPStatus.OK
+            cursor_pages.extend(await response.json())
+            cursor = response.headers.get('X-Next-Cursor')
+    assert [film['id'] for film in cursor_pages] == [film['id'] for film in expected]
+
+    # Обратный индекс и краткие записи, как их ведёт загрузчик данных
+    await redis_client.flushdb()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for film in films:
+            for film_person_id, roles in film_roles(film).items():
+                pipe.zadd(filmography_key(film_person_id), {film['id']: filmography_score(film['imdb_rating'])})
+                pipe.hset(roles_key(film_person_id), film['id'], ','.join(roles))
+            set_brief(pipe, film)
+        pipe.set(BUILT_KEY, 1)
+        await pipe.execute()
+
+    hits = await filmography_hits()
+    assert await get_pages() == expected
+    assert await filmography_hits() - hits >= 3
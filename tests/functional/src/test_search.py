@@ -102,9 +102,9 @@ async def test_search_with_redis_cache(
     # Даем время для записи в кэш
     await asyncio.sleep(1)
 
-    # Создаем ключ для проверки кэша
+    # Создаем ключ для проверки кэша (запрос в ключе приведён к нижнему регистру)
     params = {
-        'query': 'Star',
+        'query': 'star',
         'page_size': 10,
         'page_number': 1
     }